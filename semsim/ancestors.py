@@ -0,0 +1,79 @@
+"""Compute the ancestor closure of a DAG."""
+
+from typing import List, Tuple
+
+import numpy as np
+from grape import Graph
+
+
+def get_ancestor_closure(dag: Graph) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the ancestors of every node in a DAG.
+
+    The DAG is expected to be oriented from the root(s) down,
+    i.e. transposed as in `get_similarities`, so the source
+    of each edge is a parent of its destination.
+
+    Parameters
+    -------------------
+    dag: Graph
+        The DAG to compute the ancestor closure for.
+    return: Tuple[np.ndarray, np.ndarray]
+        The closure in CSR form, as (indptr, indices).
+        The ancestors of node ID i, including i itself, are
+        indices[indptr[i]:indptr[i + 1]], sorted by node ID.
+    """
+    number_of_nodes = dag.get_number_of_nodes()
+    edges = dag.get_directed_edge_node_ids()
+
+    # Group parents by child
+    order = np.argsort(edges[:, 1], kind="stable")
+    parents = edges[order, 0]
+    parents_indptr = np.zeros(number_of_nodes + 1, dtype=np.int64)
+    np.cumsum(
+        np.bincount(edges[:, 1], minlength=number_of_nodes),
+        out=parents_indptr[1:],
+    )
+
+    # Visit nodes in topological order (Kahn's algorithm),
+    # so the closure of each parent is ready before its children.
+    in_degrees = np.diff(parents_indptr)
+    children: List[List[int]] = [[] for _ in range(number_of_nodes)]
+    for parent, child in edges:
+        children[parent].append(child)
+
+    # Every node is given its ancestors unless the graph has a cycle
+    closure: List[np.ndarray] = [
+        np.array([], dtype=np.uint32)
+    ] * number_of_nodes
+    queue: List[int] = np.flatnonzero(in_degrees == 0).tolist()
+    remaining = in_degrees.copy()
+    visited = 0
+    while queue:
+        node = queue.pop()
+        visited += 1
+        node_parents = parents[parents_indptr[node]:parents_indptr[node + 1]]
+        closure[node] = np.unique(
+            np.concatenate(
+                [np.array([node], dtype=np.uint32)]
+                + [closure[parent] for parent in node_parents]
+            )
+        ).astype(np.uint32)
+        for child in children[node]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                queue.append(child)
+
+    if visited != number_of_nodes:
+        raise ValueError(
+            "Graph is not directed acyclic. Cannot compute ancestors."
+        )
+
+    indptr = np.zeros(number_of_nodes + 1, dtype=np.int64)
+    np.cumsum([len(ancestors) for ancestors in closure], out=indptr[1:])
+    indices = (
+        np.concatenate(closure)
+        if number_of_nodes > 0
+        else np.array([], dtype=np.uint32)
+    )
+
+    return indptr, indices
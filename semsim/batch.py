@@ -0,0 +1,325 @@
+"""Run many similarity jobs on one loaded graph."""
+
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from grape import Graph
+from grape.similarities import DAGResnik
+
+from .ancestors import get_ancestor_closure
+from .compute_pairwise_similarities import compute_pairwise_sims
+from .measures import check_measures
+from .precision import SIM_PRECISIONS
+from .process_ontology import (
+    VALIDATION_CACHE_NAME,
+    filter_graph,
+    get_counts,
+    load_graph,
+)
+from .validation import validate_dag
+
+JOB_DEFAULTS = {
+    "predicate": "biolink:subclass_of",
+    "root_node": "",
+    "cutoff": 2.5,
+    "annot_file": None,
+    "annot_col": None,
+    "prune": False,
+    "precision": "float32",
+    "measures": [],
+}
+
+
+def load_jobs(jobs_file: str) -> List[dict]:
+    """Load a manifest of similarity jobs.
+
+    The manifest is a JSON list of jobs, each an object with
+    "prefixes" (a list of prefixes to compare, e.g. ["HP", "MP"])
+    and optionally "name" (used as the output subdirectory),
+    "predicate", "root_node", "cutoff", "annot_file", "annot_col",
+    "prune", "precision" and "measures", as for the sim command.
+    :param jobs_file: str, path to job manifest
+    :return: list of jobs, with defaults filled in
+    """
+    if not os.path.isfile(jobs_file):
+        raise FileNotFoundError(f"Cannot find jobs file: {jobs_file}")
+    with open(jobs_file, "r") as infile:
+        raw_jobs = json.load(infile)
+
+    jobs = []
+    for index, raw_job in enumerate(raw_jobs):
+        if not raw_job.get("prefixes"):
+            raise ValueError(f"Job {index} does not specify any prefixes.")
+        job = {**JOB_DEFAULTS, **raw_job}
+        job.setdefault("name", f"{index}_{'_'.join(job['prefixes'])}")
+        try:
+            check_measures(job["measures"])
+        except ValueError as e:
+            raise ValueError(f"Job {job['name']}: {e}")
+        if job["precision"] not in SIM_PRECISIONS:
+            raise ValueError(
+                f"Job {job['name']}: precision must be one of"
+                f" {', '.join(SIM_PRECISIONS)}."
+            )
+        jobs.append(job)
+
+    names = [job["name"] for job in jobs]
+    if len(set(names)) != len(names):
+        raise ValueError("Job names must be unique.")
+
+    return jobs
+
+
+def group_jobs(jobs: List[dict]) -> Dict[Tuple[tuple, str], List[dict]]:
+    """Group jobs which are run on the same filtered DAG.
+
+    :param jobs: list of jobs, as from load_jobs
+    :return: dict of (prefixes, predicate) to list of jobs
+    """
+    groups: Dict[Tuple[tuple, str], List[dict]] = {}
+    for job in jobs:
+        key = (tuple(sorted(job["prefixes"])), job["predicate"])
+        groups.setdefault(key, []).append(job)
+    return groups
+
+
+def get_job_group_dag(
+    onto_graph: Graph,
+    prefixes: tuple,
+    predicate: str,
+    repair: bool = False,
+    cache_path: Optional[str] = None,
+) -> Optional[Graph]:
+    """Derive the DAG shared by a group of jobs from the loaded graph.
+
+    :param onto_graph: Graph, as from load_graph
+    :param prefixes: tuple of prefixes, without colons, to compare
+    :param predicate: str, predicate type to filter to
+    :param repair: bool, if True, drop self loops and edges closing
+    cycles rather than failing
+    :param cache_path: str, path to a cache of graph diagnostics
+    :return: Graph, or None if the DAG is not valid
+    """
+    dag = filter_graph(
+        onto_graph, prefixes=list(prefixes), predicate=predicate
+    )
+    try:
+        return validate_dag(dag, repair=repair, cache_path=cache_path)
+    except ValueError as e:
+        print(f"Cannot run jobs for {', '.join(prefixes)}: {e}")
+        return None
+
+
+def save_dag(dag: Graph, path: str) -> None:
+    """Write a DAG to node and edge files, for load_dag.
+
+    :param dag: Graph, as from get_job_group_dag
+    :param path: str, path prefix of the node and edge files
+    :return: None
+    """
+    dag.dump_nodes(
+        f"{path}_nodes.tsv",
+        verbose=False,
+        separator="\t",
+        header=True,
+        nodes_column_number=0,
+        nodes_column="id",
+        node_types_column_number=1,
+        node_type_column="category",
+    )
+    dag.dump_edges(
+        f"{path}_edges.tsv",
+        verbose=False,
+        separator="\t",
+        header=True,
+        sources_column_number=0,
+        sources_column="subject",
+        destinations_column_number=1,
+        destinations_column="object",
+        edge_types_column_number=2,
+        edge_type_column="predicate",
+        directed=True,
+    )
+
+
+def load_dag(name: str, path: str) -> Graph:
+    """Load a DAG written by save_dag.
+
+    :param name: str, name of the graph
+    :param path: str, path prefix of the node and edge files
+    :return: Graph
+    """
+    return Graph.from_csv(
+        node_path=f"{path}_nodes.tsv",
+        edge_path=f"{path}_edges.tsv",
+        node_list_separator="\t",
+        edge_list_separator="\t",
+        node_list_header=True,
+        edge_list_header=True,
+        nodes_column="id",
+        node_list_node_types_column="category",
+        sources_column="subject",
+        destinations_column="object",
+        edge_list_edge_types_column="predicate",
+        directed=True,
+        name=name,
+    )
+
+
+def run_saved_job_group(name: str, path: str, **kwargs) -> bool:
+    """Run jobs on a DAG written by save_dag, e.g. in a worker process.
+
+    :param name: str, name of the graph
+    :param path: str, path prefix of the node and edge files
+    :param kwargs: arguments to run_job_group, except dag
+    :return: True if all jobs were successful
+    """
+    return run_job_group(dag=load_dag(name, path), **kwargs)
+
+
+def run_job_group(dag: Graph, jobs: List[dict], output_dir: str) -> bool:
+    """Run jobs sharing a DAG.
+
+    The ancestor closure is computed once, and a Resnik model
+    is fit once for each distinct set of counts.
+    :param dag: Graph, as from get_job_group_dag
+    :param jobs: list of jobs, as from load_jobs
+    :param output_dir: str, where to write a subdirectory for each job
+    :return: True if all jobs were successful
+    """
+    try:
+        ancestor_closure = get_ancestor_closure(dag)
+    except ValueError as e:
+        print(f"Cannot run jobs {', '.join(job['name'] for job in jobs)}: {e}")
+        return False
+
+    models = {}
+    success = True
+    for job in jobs:
+        counts_key = (job["annot_file"], job["annot_col"])
+        if counts_key not in models:
+            counts = get_counts(dag, job["annot_file"], job["annot_col"])
+            resnik_model = DAGResnik()
+            resnik_model.fit(dag, node_counts=counts)
+            models[counts_key] = (counts, resnik_model)
+        counts, resnik_model = models[counts_key]
+
+        print(f"Running job {job['name']}...")
+        job_dir = os.path.join(output_dir, job["name"])
+        os.makedirs(job_dir, exist_ok=True)
+        if not compute_pairwise_sims(
+            dag=dag,
+            counts=counts,
+            cutoff=float(job["cutoff"]),
+            path=job_dir,
+            prefixes=list(job["prefixes"]),
+            root_node=job["root_node"],
+            prune=job["prune"],
+            precision=job["precision"],
+            resnik_model=resnik_model,
+            ancestor_closure=ancestor_closure,
+            measures=job["measures"],
+        ):
+            print(f"Job {job['name']} failed.")
+            success = False
+
+    return success
+
+
+def run_batch(
+    ontology: str,
+    jobs: List[dict],
+    output_dir: str,
+    input_file: Optional[str] = None,
+    graph_store: Optional[str] = None,
+    graph_version: Optional[str] = None,
+    repair: bool = False,
+    workers: int = 1,
+) -> bool:
+    """Load a graph once and run many similarity jobs on it.
+
+    The graph is loaded, filtered and validated once, in this
+    process, for each group of jobs sharing a DAG. The groups are
+    independent, so with more than one worker they are run in
+    separate processes. grape holds the global interpreter lock,
+    so threads would not run them at once. grape graphs cannot be
+    pickled, so each DAG is passed to its worker as node and edge
+    files in a temporary directory within output_dir.
+    :param ontology: str, name of ontology to retrieve and process.
+    :param jobs: list of jobs, as from load_jobs
+    :param output_dir: str, where to write a subdirectory for each job
+    :param input_file: path to a tar.gz compressed file containing
+    KGX TSV node and edge files
+    :param graph_store: str, path to a graph store directory to
+    load the ontology from, without network access
+    :param graph_version: str, version of the ontology to load
+    from the graph store
+    :param repair: bool, if True, drop self loops and edges closing
+    cycles rather than failing
+    :param workers: int, number of processes to run groups of jobs in
+    :return: True if all jobs were successful
+    """
+    cache_path = (
+        os.path.join(graph_store, VALIDATION_CACHE_NAME)
+        if graph_store
+        else None
+    )
+
+    groups = group_jobs(jobs)
+    print(f"Running {len(jobs)} jobs on {len(groups)} filtered graphs.")
+    onto_graph = load_graph(
+        ontology=ontology,
+        input_file=input_file,
+        graph_store=graph_store,
+        graph_version=graph_version,
+    )
+    os.makedirs(output_dir, exist_ok=True)
+
+    workers = min(workers, len(groups))
+    if workers <= 1:
+        results = []
+        for (prefixes, predicate), group in groups.items():
+            dag = get_job_group_dag(
+                onto_graph, prefixes, predicate, repair, cache_path
+            )
+            results.append(
+                dag is not None and run_job_group(dag, group, output_dir)
+            )
+        return all(results)
+
+    # The threads of grape's pool do not survive a fork,
+    # so workers are started afresh.
+    with tempfile.TemporaryDirectory(
+        dir=output_dir, prefix=".batch-"
+    ) as dag_dir, ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        results = []
+        futures = []
+        for index, ((prefixes, predicate), group) in enumerate(
+            groups.items()
+        ):
+            dag = get_job_group_dag(
+                onto_graph, prefixes, predicate, repair, cache_path
+            )
+            if dag is None:
+                results.append(False)
+                continue
+            path = os.path.join(dag_dir, str(index))
+            save_dag(dag, path)
+            futures.append(
+                pool.submit(
+                    run_saved_job_group,
+                    name=dag.get_name(),
+                    path=path,
+                    jobs=group,
+                    output_dir=output_dir,
+                )
+            )
+        results.extend(future.result() for future in futures)
+        return all(results)
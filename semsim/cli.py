@@ -1,10 +1,11 @@
 """Run the semantic similarity pipeline."""
 import os
+from typing import Optional, cast
 
 import click
 
-from semsim.get_phenodigm_pairs import make_phenodigm
-from semsim.process_ontology import get_similarities
+# Pipeline modules are imported within each command,
+# as grape and pandas are slow to import.
 
 
 @click.group()
@@ -29,10 +30,28 @@ def main():
 )
 @click.option("--root_node", "-n", required=True, default="")
 @click.option("--input_file", "-i", required=False)
+@click.option("--prune", is_flag=True, default=False)
+@click.option("--graph_store", "-g", required=False)
+@click.option("--graph_version", "-v", required=False)
+@click.option("--repair", is_flag=True, default=False)
+@click.option("--shared_model", "-s", required=False)
+@click.option(
+    "--precision",
+    type=click.Choice(["float32", "uint16"]),
+    required=False,
+    default="float32",
+)
+@click.option(
+    "--measures",
+    "-m",
+    callback=lambda _, __, x: x.split(",") if x else [],
+    required=False,
+)
+@click.option("--profile", required=False)
 @click.argument("ontology", default=None)
 def sim(
     ontology: str,
-    cutoff: str,
+    cutoff: float,
     annot_file: str,
     annot_col: str,
     output_dir: str,
@@ -40,6 +59,14 @@ def sim(
     predicate: str,
     root_node: str,
     input_file: str,
+    prune: bool,
+    graph_store: str,
+    graph_version: str,
+    repair: bool,
+    shared_model: str,
+    precision: str,
+    measures: list,
+    profile: str,
 ) -> None:
     """Generate a file containing the semantic similarity.
 
@@ -64,10 +91,36 @@ def sim(
     specifically for Jaccard calculations.
     :param input_file: path to a tar.gz compressed file containing
     KGX TSV node and edge files.
+    :param prune: if set, only compare pairs of terms sharing an
+    ancestor informative enough to meet the cutoff. This keeps every
+    pair meeting the cutoff, so may write more rows than without it,
+    where grape drops some of these pairs.
+    :param graph_store: path to a graph store directory, as populated
+    by the fetch command. If provided, the graph will be loaded from
+    here without network access.
+    :param graph_version: version of the graph to load from the
+    graph store.
+    :param repair: if set, drop self loops and edges closing cycles
+    from the graph instead of stopping.
+    :param shared_model: directory to also write the fitted model to.
+    Many somesim processes may then use it at once without each
+    loading the graph.
+    :param precision: how to store scores: float32, or uint16 with
+    a scale per column, written to a file alongside the output.
+    :param measures: additional similarity measures to compute for
+    each pair, comma-delimited, from lin, jiang_conrath, simgic and
+    cosine. Each is written as an extra column.
+    :param profile: directory to write a profile of each stage to,
+    as a cProfile file and a collapsed stack file for flame graphs.
     :return: None
     """
+    from semsim.measures import check_measures
+    from semsim.process_ontology import get_similarities
+
     print(f"Input graph is {ontology}.")
 
+    check_measures(measures)
+
     if input_file:
         if os.path.isfile(input_file):
             print(f"Input graph file: {input_file}")
@@ -84,6 +137,9 @@ def sim(
             "Need both annot_file and annot_col if using specific freq values."
         )
 
+    if graph_store and not graph_version:
+        raise ValueError("Need graph_version if using a graph_store.")
+
     cutoff = float(cutoff)
 
     if not prefixes:
@@ -104,6 +160,14 @@ def sim(
         root_node=root_node,
         subset=False,
         input_file=input_file,
+        prune=prune,
+        graph_store=graph_store,
+        graph_version=graph_version,
+        repair=repair,
+        shared_model=shared_model,
+        precision=precision,
+        measures=measures,
+        profile_dir=profile,
     ):
         print(f"Wrote to {output_dir}.")
     else:
@@ -122,11 +186,19 @@ def sim(
 @click.option(
     "--predicate", "-r", required=True, default="biolink:subclass_of"
 )
+@click.option("--graph_store", "-g", required=False)
+@click.option("--graph_version", "-v", required=False)
+@click.option("--shared_model", "-s", required=False)
+@click.option("--profile", required=False)
 @click.argument("ontology", default=None)
 def somesim(
     ontology: str,
     participants: list,
     predicate: str,
+    graph_store: str,
+    graph_version: str,
+    shared_model: Optional[str],
+    profile: str,
 ) -> dict:
     """Return the semantic similarity for a list of nodes.
 
@@ -138,9 +210,60 @@ def somesim(
     similarity scores for, comma-delimited, e.g., HP:0500167,MP:0004731
     :param predicate: A predicate type to filter on.
     Defaults to biolink:subclass_of.
+    :param graph_store: path to a graph store directory, as populated
+    by the fetch command. If provided, an index of the graph, filtered
+    to the predicate, is built and cached there on first use, and
+    similarities are computed from the ancestors of the participants
+    in the index. Graphs with cycles along the predicate cannot be
+    indexed, so they are scored from the filtered graph instead.
+    :param graph_version: version of the graph to load from the
+    graph store.
+    :param shared_model: directory of a model written by the sim
+    command. If provided, similarities are computed from this model
+    instead of loading the graph.
+    :param profile: directory to write a profile of each stage to,
+    as a cProfile file and a collapsed stack file for flame graphs.
     :return: dict of tuples, with the IDs of each pair (a tuple) as
     the key and a tuple of (Resnik, Jaccard) as value.
     """
+    from semsim.profiling import profile_stage
+
+    if graph_store and not graph_version:
+        raise ValueError("Need graph_version if using a graph_store.")
+
+    if graph_store and not shared_model:
+        from semsim.graph_store import get_index_path
+
+        index_path = get_index_path(
+            graph_store, ontology, graph_version, predicate
+        )
+        if os.path.isdir(index_path):
+            shared_model = index_path
+        else:
+            from semsim.process_ontology import get_query_similarities
+
+            sims = get_query_similarities(
+                ontology=ontology,
+                nodes=participants,
+                predicate=predicate,
+                graph_store=graph_store,
+                graph_version=graph_version,
+                profile_dir=profile,
+            )
+            print(sims)
+            return sims
+
+    if shared_model:
+        from semsim.shared_model import compute_shared_subset_sims
+
+        print(f"Using shared model at {shared_model}.")
+        with profile_stage(profile, "shared_subset_sims"):
+            sims = compute_shared_subset_sims(shared_model, participants)
+        print(sims)
+        return sims
+
+    from semsim.process_ontology import get_similarities
+
     print(f"Input graph is {ontology}.")
     print(f"Filtering to {predicate}.")
 
@@ -148,22 +271,152 @@ def somesim(
     # make counts (Dict[curie, count])
     # call compute pairwise similarity
     # write out
-    sims = get_similarities(
-        ontology=ontology,
-        cutoff=0,
-        annot_file=None,
-        annot_col=None,
-        output_dir=None,
-        nodes=participants,
-        predicate=predicate,
-        root_node="",
-        subset=True,
+    sims = cast(
+        dict,
+        get_similarities(
+            ontology=ontology,
+            cutoff=0,
+            annot_file=None,
+            annot_col=None,
+            output_dir=None,
+            nodes=participants,
+            predicate=predicate,
+            root_node="",
+            subset=True,
+            graph_store=graph_store,
+            graph_version=graph_version,
+            profile_dir=profile,
+        )
     )
 
     print(sims)
     return sims
 
 
+@main.command()
+@click.option("--graph_store", "-g", required=True, default="graphs")
+@click.option("--graph_version", "-v", required=True)
+@click.option("--input_file", "-i", required=False)
+@click.argument("ontology", default=None)
+def fetch(
+    ontology: str,
+    graph_store: str,
+    graph_version: str,
+    input_file: str,
+) -> None:
+    """Stage a graph in a local graph store.
+
+    Graphs in the store may then be used by the sim and somesim
+    commands without network access. Their node and edge lists are
+    extracted when staged, so they are not decompressed on each use.
+
+    :param ontology: A graph or ontology to stage (e.g., HP, KGPhenio).
+    If specifying a local file, use the name of the graph for this
+    argument and use the --input_file argument.
+    :param graph_store: Path to the graph store directory.
+    :param graph_version: Version of the graph to stage,
+    e.g. 2022-06-11.
+    :param input_file: path to a tar.gz compressed file containing
+    KGX TSV node and edge files. If not provided, the graph will be
+    downloaded from KG-OBO or KG-Hub.
+    :return: None
+    """
+    from semsim.graph_store import stage_graph
+
+    outpath = stage_graph(
+        store_dir=graph_store,
+        name=ontology,
+        version=graph_version,
+        input_file=input_file,
+    )
+    print(f"Staged version {graph_version} of {ontology} at {outpath}.")
+
+    return None
+
+
+@main.command()
+@click.option("--jobs", "-j", required=True)
+@click.option("--output_dir", "-o", required=False, default="data")
+@click.option("--input_file", "-i", required=False)
+@click.option("--graph_store", "-g", required=False)
+@click.option("--graph_version", "-v", required=False)
+@click.option("--repair", is_flag=True, default=False)
+@click.option("--workers", "-w", required=False, default=1, type=int)
+@click.argument("ontology", default=None)
+def batch(
+    ontology: str,
+    jobs: str,
+    output_dir: str,
+    input_file: str,
+    graph_store: str,
+    graph_version: str,
+    repair: bool,
+    workers: int,
+) -> None:
+    """Run many similarity jobs on one graph.
+
+    The graph is loaded once. Jobs comparing the same prefixes along
+    the same predicate share a filtered graph and fitted model. With
+    more than one worker, each filtered graph is passed to its worker
+    process as temporary files in the output directory.
+
+    :param ontology: A graph or ontology on which to compute sem sim
+    (e.g., HP, MP, CHEBI, KGPhenio), as for the sim command.
+    :param jobs: path to a JSON list of jobs. Each is an object with
+    "prefixes" (e.g. ["HP", "MP"]) and optionally "name", "predicate",
+    "root_node", "cutoff", "annot_file", "annot_col", "prune",
+    "precision" and "measures", as for the sim command.
+    :param output_dir: Path to write a directory of output for each job.
+    :param input_file: path to a tar.gz compressed file containing
+    KGX TSV node and edge files.
+    :param graph_store: path to a graph store directory, as populated
+    by the fetch command.
+    :param graph_version: version of the graph to load from the
+    graph store.
+    :param repair: if set, drop self loops and edges closing cycles
+    from the graph instead of stopping.
+    :param workers: number of processes to run, each processing
+    filtered graphs one at a time.
+    :return: None
+    """
+    from semsim.batch import load_jobs, run_batch
+
+    print(f"Input graph is {ontology}.")
+
+    if input_file and not os.path.isfile(input_file):
+        raise FileNotFoundError(f"Cannot find input file: {input_file}")
+
+    if graph_store and not graph_version:
+        raise ValueError("Need graph_version if using a graph_store.")
+
+    job_list = load_jobs(jobs)
+    for job in job_list:
+        if bool(job["annot_file"]) != bool(job["annot_col"]):
+            raise ValueError(
+                f"Job {job['name']} needs both annot_file and annot_col "
+                "if using specific freq values."
+            )
+
+    if not os.path.exists(output_dir):
+        os.mkdir(output_dir)
+
+    if run_batch(
+        ontology=ontology,
+        jobs=job_list,
+        output_dir=output_dir,
+        input_file=input_file,
+        graph_store=graph_store,
+        graph_version=graph_version,
+        repair=repair,
+        workers=workers,
+    ):
+        print(f"Wrote to {output_dir}.")
+    else:
+        print(f"Semantic similarity calculation failed for {ontology}.")
+
+    return None
+
+
 @main.command()
 @click.option("--output_dir", "-o", required=False, default="data")
 @click.option(
@@ -181,6 +434,13 @@ def somesim(
     callback=lambda _, __, x: x.split(",") if x else [],
     required=True,
 )
+@click.option(
+    "--precision",
+    type=click.Choice(["float64", "float32"]),
+    required=False,
+    default="float64",
+)
+@click.option("--profile", required=False)
 def phenodigm(
     cutoff: str,
     jaccard_sim_file: str,
@@ -188,6 +448,8 @@ def phenodigm(
     mapping: str,
     output_dir: str,
     prefixes: list,
+    precision: str,
+    profile: str,
 ) -> None:
     """Produce phenodigm-style similarity input file.
 
@@ -202,8 +464,14 @@ def phenodigm(
         (produced from sim commnad)
     :param mapping: file containing all equivalent terms
     :param output_dir: where to write out file
+    :param precision: float64 or float32, precision to load
+        and write scores at
+    :param profile: directory to write a profile of each stage to,
+        as a cProfile file and a collapsed stack file for flame graphs.
     :return: None
     """
+    from semsim.get_phenodigm_pairs import make_phenodigm
+
     if len(prefixes) > 2 or len(prefixes) < 2:
         raise ValueError("Only pairs of prefixes are supported.")
     else:
@@ -218,6 +486,8 @@ def phenodigm(
         outpath=os.path.join(output_dir, "phenodigm_semsim.txt"),
         prefixa=prefixa,
         prefixb=prefixb,
+        precision=precision,
+        profile_dir=profile,
     )
     print(f"Wrote to {outpath}.")
 
@@ -1,12 +1,29 @@
 """Compute pairwise similarities."""
 
+import os
 import pathlib
 from itertools import combinations
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from grape import Graph
 from grape.similarities import DAGResnik
 
+from .ancestors import get_ancestor_closure
+from .measures import check_measures, compute_measures
+from .precision import (
+    SIM_PRECISIONS,
+    get_scales_path,
+    quantize_scores,
+    write_scales,
+)
+from .profiling import profile_stage
+from .pruning import (
+    get_information_contents,
+    get_pruned_resnik_similarities,
+)
+from .shared_model import save_shared_model
+
 
 def compute_pairwise_sims(
     dag: Graph,
@@ -15,6 +32,13 @@ def compute_pairwise_sims(
     prefixes: list,
     path: str,
     root_node: str,
+    prune: bool = False,
+    shared_model_path: Optional[str] = None,
+    precision: str = "float32",
+    resnik_model: Optional[DAGResnik] = None,
+    ancestor_closure: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    measures: Optional[List[str]] = None,
+    profile_dir: Optional[str] = None,
 ) -> bool:
     """Compute and store pairwise Resnik and Jaccard similarities.
 
@@ -32,9 +56,43 @@ def compute_pairwise_sims(
         Nodes with one of these prefixes will be compared for similarity.
     root_node: str
         Name of a root node to specify for Jaccard comparisons.
+    prune: bool
+        If True, only compare pairs of nodes sharing an ancestor
+        informative enough to meet the cutoff, rather than
+        enumerating all pairs of nodes. Either way, Resnik
+        similarity is the information content of the most
+        informative common ancestor, as for `compute_subset_sims`.
+    shared_model_path: str
+        If provided, also write the fitted model to this directory,
+        for scoring by other processes with `compute_shared_subset_sims`.
+    precision: str
+        How to store scores: float32, or uint16 with a scale per
+        column, written alongside the output
+        (see `semsim.precision.read_similarities`).
+    resnik_model: DAGResnik
+        A Resnik model already fit on the DAG with these counts,
+        e.g. shared between runs. If not provided, one will be fit.
+    ancestor_closure: Tuple[np.ndarray, np.ndarray]
+        The ancestor closure of the DAG, as from
+        `semsim.ancestors.get_ancestor_closure`, e.g. shared
+        between runs. If not provided, it will be computed.
+    measures: List[str]
+        Names of additional similarity measures to compute for each
+        pair, as registered in `semsim.measures.MEASURES`, e.g. lin,
+        jiang_conrath, simgic or cosine. Each is written as a column.
+    profile_dir: str
+        If provided, profile each stage and write the profiles to
+        this directory (see `semsim.profiling.profile_stage`).
     return: bool
         True if successful
     """
+    if precision not in SIM_PRECISIONS:
+        raise ValueError(
+            f"Precision must be one of {', '.join(SIM_PRECISIONS)}."
+        )
+    measures = list(dict.fromkeys(measures or []))
+    check_measures(measures)
+
     print(
         f"Calculating Resnik and Jaccard scores for {', '.join(prefixes)}..."
     )
@@ -43,8 +101,22 @@ def compute_pairwise_sims(
     outpath = pathlib.Path.cwd() / path
     rs_path = outpath / f"{dag_name}_similarities"
 
-    resnik_model = DAGResnik()
-    resnik_model.fit(dag, node_counts=counts)
+    if resnik_model is None:
+        with profile_stage(profile_dir, "fit_resnik"):
+            resnik_model = DAGResnik()
+            resnik_model.fit(dag, node_counts=counts)
+
+    if ancestor_closure is None:
+        print("Computing ancestors...")
+        with profile_stage(profile_dir, "ancestor_closure"):
+            ancestor_closure = get_ancestor_closure(dag)
+
+    if shared_model_path:
+        print(f"Writing shared model to {shared_model_path}...")
+        with profile_stage(profile_dir, "shared_model"):
+            save_shared_model(
+                dag, resnik_model, shared_model_path, ancestor_closure
+            )
 
     if root_node != "":
         root_select = [dag.get_node_id_from_node_name(root_node)]
@@ -65,43 +137,92 @@ def compute_pairwise_sims(
     try:
 
         print("Computing Resnik...")
-        rs_df = resnik_model.get_similarities_from_clique_graph_node_prefixes(
-            node_prefixes=prefixes,
-            minimum_similarity=cutoff,
-            return_similarities_dataframe=True,
-        )
+        with profile_stage(profile_dir, "resnik"):
+            if prune:
+                rs_df = get_pruned_resnik_similarities(
+                    dag=dag,
+                    resnik_model=resnik_model,
+                    prefixes=prefixes,
+                    cutoff=cutoff,
+                    ancestor_closure=ancestor_closure,
+                )
+            else:
+                rs_df = (
+                    resnik_model.get_similarities_from_clique_graph_node_prefixes(  # NOQA
+                        node_prefixes=prefixes,
+                        minimum_similarity=cutoff,
+                        return_similarities_dataframe=True,
+                    )
+                )
 
         print("Computing Jaccard...")
         all_jaccard_names = []
-        for root in root_select:
-            root_name = dag.get_node_name_from_node_id(root)
-            if len(root_select) == 1:
-                jaccard_name = "jaccard"
-            else:
-                jaccard_name = f"jaccard_{root_name}"
-                all_jaccard_names.append(jaccard_name)
-            rs_df[jaccard_name] = dag.get_ancestors_jaccard_from_node_ids(
-                dag.get_breadth_first_search_from_node_ids(
-                    src_node_id=root,
-                    compute_predecessors=True,
-                ),
-                list(rs_df["source"]),
-                list(rs_df["destination"]),
-            )
+        with profile_stage(profile_dir, "jaccard"):
+            for root in root_select:
+                root_name = dag.get_node_name_from_node_id(root)
+                if len(root_select) == 1:
+                    jaccard_name = "jaccard"
+                else:
+                    jaccard_name = f"jaccard_{root_name}"
+                    all_jaccard_names.append(jaccard_name)
+                rs_df[jaccard_name] = dag.get_ancestors_jaccard_from_node_ids(
+                    dag.get_breadth_first_search_from_node_ids(
+                        src_node_id=root,
+                        compute_predecessors=True,
+                    ),
+                    list(rs_df["source"]),
+                    list(rs_df["destination"]),
+                )
 
-        if len(root_select) > 1:
-            print("Determining maximum Jaccard similarity...")
-            rs_df["jaccard"] = rs_df[all_jaccard_names].max(axis=1)
+            if len(root_select) > 1:
+                print("Determining maximum Jaccard similarity...")
+                rs_df["jaccard"] = rs_df[all_jaccard_names].max(axis=1)
+
+        # grape scores the first common ancestor it finds, which on
+        # graphs with multiple roots is not always the most informative.
+        # Resnik and the other measures are instead computed together
+        # from the ancestor closure, so they share the same MICA.
+        closure_measures = list(dict.fromkeys(["resnik"] + measures))
+        print(f"Computing {', '.join(closure_measures)}...")
+        with profile_stage(profile_dir, "measures"):
+            similarities = compute_measures(
+                ancestor_closure,
+                get_information_contents(resnik_model),
+                rs_df["source"].to_numpy(),
+                rs_df["destination"].to_numpy(),
+                closure_measures,
+            )
+            rs_df["resnik_score"] = similarities["resnik"]
+            for measure in measures:
+                rs_df[measure] = similarities[measure]
 
         # Remap node IDs to node names
         print("Retrieving node names...")
-        for col in ["source", "destination"]:
-            rs_df[col] = dag.get_node_names_from_node_ids(rs_df[col])
+        with profile_stage(profile_dir, "node_names"):
+            for col in ["source", "destination"]:
+                rs_df[col] = dag.get_node_names_from_node_ids(rs_df[col])
 
         print(f"Writing output to {rs_path}...")
-        rs_df.sort_values(by=["resnik_score"], ascending=False, inplace=True)
+        with profile_stage(profile_dir, "sort"):
+            rs_df.sort_values(
+                by=["resnik_score"], ascending=False, inplace=True
+            )
+
+        with profile_stage(profile_dir, "write"):
+            score_columns = (
+                ["resnik_score", "jaccard"] + all_jaccard_names + measures
+            )
+            if precision == "uint16":
+                write_scales(
+                    str(rs_path), quantize_scores(rs_df, score_columns)
+                )
+            else:
+                rs_df[score_columns] = rs_df[score_columns].astype(np.float32)
+                # Don't leave scales from a previous run with the output
+                if os.path.exists(get_scales_path(str(rs_path))):
+                    os.remove(get_scales_path(str(rs_path)))
 
-        rs_df.to_csv(rs_path, index=False)
+            rs_df.to_csv(rs_path, index=False)
 
         success = True
     except ValueError as e:
@@ -118,6 +239,14 @@ def compute_subset_sims(
 ) -> dict:
     """Compute Resnik and Jaccard similarities for a given list of nodes.
 
+    Resnik similarity is the information content of the most
+    informative ancestor shared by each pair, over all of their
+    ancestors, and Jaccard similarity is the maximum over roots.
+    This matches `compute_pairwise_sims` and scoring from a shared
+    model. On graphs with multiple roots, grape's bipartite Resnik
+    may instead depend on the order of the pair, so it is only used
+    for graphs with cycles, which have no ancestor closure.
+
     Parameters
     -------------------
     dag: Graph
@@ -131,30 +260,52 @@ def compute_subset_sims(
     """
     print(f"Calculating Resnik and Jaccard scores for {len(nodes)} nodes...")
 
-    all_sims = {}
-    all_pairs = combinations(nodes, 2)
+    all_pairs = list(combinations(nodes, 2))
+    if not all_pairs:
+        return {}
 
     resnik_model = DAGResnik()
     resnik_model.fit(dag, node_counts=counts)
 
-    for pair in all_pairs:
-        rs = resnik_model.get_similarities_from_bipartite_graph_node_names(
-            source_node_names=pair[0], destination_node_names=pair[1]
-        )
-        rs_lst = list(rs[0].flat)
-        if len(rs_lst) == 0:
-            rs_val = 0
-        else:
-            rs_val = rs_lst[0]
+    sources = dag.get_node_ids_from_node_names([pair[0] for pair in all_pairs])
+    destinations = dag.get_node_ids_from_node_names(
+        [pair[1] for pair in all_pairs]
+    )
+    try:
+        resnik = compute_measures(
+            get_ancestor_closure(dag),
+            get_information_contents(resnik_model),
+            np.array(sources),
+            np.array(destinations),
+            ["resnik"],
+        )["resnik"]
+    except ValueError:
+        # Cycles kept by validation leave no ancestor closure,
+        # so grape's Resnik model scores each pair instead.
+        resnik = np.zeros(len(all_pairs))
+        for i, pair in enumerate(all_pairs):
+            rs = resnik_model.get_similarities_from_bipartite_graph_node_names(
+                source_node_names=[pair[0]], destination_node_names=[pair[1]]
+            )
+            # Pairs with no common ancestor have no similarity returned
+            if len(rs[1]) > 0:
+                resnik[i] = rs[1][0]
 
-        js = dag.get_ancestors_jaccard_from_node_names(
-            dag.get_breadth_first_search_from_node_names(
-                src_node_name=dag.get_root_node_names()[0],
-                compute_predecessors=True,
+    jaccard = np.zeros(len(all_pairs))
+    for root in dag.get_root_node_ids():
+        jaccard = np.maximum(
+            jaccard,
+            dag.get_ancestors_jaccard_from_node_ids(
+                dag.get_breadth_first_search_from_node_ids(
+                    src_node_id=root,
+                    compute_predecessors=True,
+                ),
+                sources,
+                destinations,
             ),
-            [pair[0]],
-            [pair[1]],
         )
-        all_sims[pair] = (float(rs_val), float(js))
 
-    return all_sims
+    return {
+        pair: (float(rs_val), float(js_val))
+        for pair, rs_val, js_val in zip(all_pairs, resnik, jaccard)
+    }
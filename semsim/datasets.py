@@ -0,0 +1,54 @@
+"""Registry of graph names and the grape repositories providing them."""
+
+import gzip
+import importlib.util
+import json
+import os
+from functools import lru_cache
+
+GRAPE_DATASETS_MOD = "grape.datasets"
+
+# grape.datasets re-exports ensmallen.datasets, which holds the metadata
+METADATA_PACKAGE = "ensmallen"
+
+
+def get_metadata_path(repository: str) -> str:
+    """Find the graph metadata grape distributes for a repository.
+
+    This locates grape without importing it, as that is slow.
+    :param repository: str, name of repository, either kgobo or kghub
+    :return: str, path to the compressed JSON metadata
+    """
+    spec = importlib.util.find_spec(METADATA_PACKAGE)
+    if spec is None or not spec.submodule_search_locations:
+        raise ImportError(f"Cannot find {METADATA_PACKAGE}.")
+    return os.path.join(
+        list(spec.submodule_search_locations)[0],
+        "datasets",
+        f"{repository}.json.gz",
+    )
+
+
+@lru_cache(maxsize=None)
+def load_graph_metadata(repository: str) -> dict:
+    """Load the graph metadata grape distributes for a repository.
+
+    :param repository: str, name of repository, either kgobo or kghub
+    :return: dict of graph name to dict of version to metadata,
+    including the URLs the graph is hosted at
+    """
+    with gzip.open(get_metadata_path(repository), "rt") as metadata_file:
+        return json.load(metadata_file)
+
+
+def get_graph_repository(name: str) -> str:
+    """Get the name of the grape repository providing a graph.
+
+    Graphs are looked up in the KG-Hub metadata distributed with
+    grape; anything else is assumed to be an ontology from KG-OBO.
+    :param name: str, name of graph, e.g. HP or KGPhenio
+    :return: str, name of repository, either kgobo or kghub
+    """
+    if name in load_graph_metadata("kghub"):
+        return "kghub"
+    return "kgobo"
@@ -1,10 +1,14 @@
 """Get pairs of phenotype terms meeting a similarity threshold."""
 
 import os
+from typing import Optional
 
 import pandas as pd
 from tqdm import tqdm
 
+from .precision import read_score_matrix
+from .profiling import profile_stage
+
 
 def make_phenodigm(
     cutoff: str,
@@ -14,6 +18,8 @@ def make_phenodigm(
     outpath: str,
     prefixa: str,
     prefixb: str,
+    precision: str = "float64",
+    profile_dir: Optional[str] = None,
 ) -> str:
     """Produce a phenodigm file.
 
@@ -33,30 +39,39 @@ def make_phenodigm(
     :param outpath: where to write out file
     :param prefixa: prefix of first ontology, e.g. 'HP'
     :param prefixb: prefix of second ontology, e.g. 'MP'
+    :param precision: float64 or float32, precision to load
+        and write scores at
+    :param profile_dir: if provided, profile each stage and write
+        the profiles to this directory
     :return: str, path to output
     """
     # Check for existence of all input files first
     # and load them if they're present
-    for filepath in [
-        same_jaccard_sim_file,
-        same_resnik_sim_file,
-        mapping_file,
-    ]:
-        if not os.path.exists(filepath):
-            raise FileNotFoundError(f"Cannot find {filepath}!")
-        else:
-            print(f"Loading {filepath}...")
-        if filepath.endswith("jaccard"):
-            jaccard_df = pd.read_csv(filepath, sep=",", engine="c")
-            jaccard_df.rename({"Unnamed: 0": prefixa}, axis=1, inplace=True)
-        if filepath.endswith("resnik"):
-            resnik_df = pd.read_csv(filepath, sep=",", engine="c")
-            resnik_df.rename({"Unnamed: 0": prefixa}, axis=1, inplace=True)
-        if filepath == mapping_file:
-            map_df = pd.read_csv(
-                filepath, sep=",", engine="c", usecols=["p1", "p2"]
-            )
-            filtermap_df = make_filtered_map(map_df, prefixa, prefixb)
+    with profile_stage(profile_dir, "load_inputs"):
+        for filepath in [
+            same_jaccard_sim_file,
+            same_resnik_sim_file,
+            mapping_file,
+        ]:
+            if not os.path.exists(filepath):
+                raise FileNotFoundError(f"Cannot find {filepath}!")
+            else:
+                print(f"Loading {filepath}...")
+            if filepath.endswith("jaccard"):
+                jaccard_df = read_score_matrix(filepath, precision)
+                jaccard_df.rename(
+                    {"Unnamed: 0": prefixa}, axis=1, inplace=True
+                )
+            if filepath.endswith("resnik"):
+                resnik_df = read_score_matrix(filepath, precision)
+                resnik_df.rename(
+                    {"Unnamed: 0": prefixa}, axis=1, inplace=True
+                )
+            if filepath == mapping_file:
+                map_df = pd.read_csv(
+                    filepath, sep=",", engine="c", usecols=["p1", "p2"]
+                )
+                filtermap_df = make_filtered_map(map_df, prefixa, prefixb)
 
     # For each A term in the filtered map, get Resnik score above cutoff.
     # specifically, get a list of matching rows and then make a df out
@@ -68,50 +83,56 @@ def make_phenodigm(
         f"cutoff {cutoff}..."
     )
 
-    for term in tqdm(set(filtermap_df[prefixa + "_id"])):
-        rmatches = resnik_df.loc[(resnik_df[prefixa] == term)]
-        jmatches = jaccard_df.loc[(jaccard_df[prefixa] == term)]
-        for match in rmatches.iloc[0:1, 1:]:
-            try:
-                matchlist = [
-                    term,
-                    match,
-                    jmatches[match].values[0],
-                    rmatches[match].values[0],
-                ]
-                if (
-                    float(rmatches[match].values[0]) > float(cutoff)
-                    and matchlist not in match_data
-                ):
-                    match_data.append(matchlist)
-            except (TypeError, IndexError):
-                error_data.append(term)  # Some terms may not have scores
-
-    # Jaccard score and Resnik score
-    full_df = pd.DataFrame(
-        match_data, columns=[prefixa, prefixb, "jaccard", "resnik"]
-    )
+    with profile_stage(profile_dir, "match_terms"):
+        for term in tqdm(set(filtermap_df[prefixa + "_id"])):
+            rmatches = resnik_df.loc[(resnik_df[prefixa] == term)]
+            jmatches = jaccard_df.loc[(jaccard_df[prefixa] == term)]
+            for match in rmatches.iloc[0:1, 1:]:
+                try:
+                    matchlist = [
+                        term,
+                        match,
+                        jmatches[match].values[0],
+                        rmatches[match].values[0],
+                    ]
+                    if (
+                        float(rmatches[match].values[0]) > float(cutoff)
+                        and matchlist not in match_data
+                    ):
+                        match_data.append(matchlist)
+                except (TypeError, IndexError):
+                    error_data.append(term)  # Some terms may not have scores
+
+    with profile_stage(profile_dir, "build_table"):
+        # Jaccard score and Resnik score
+        full_df = pd.DataFrame(
+            match_data, columns=[prefixa, prefixb, "jaccard", "resnik"]
+        )
+        full_df[["jaccard", "resnik"]] = full_df[["jaccard", "resnik"]].astype(
+            precision
+        )
 
-    # Include MP term
-    full_df = pd.merge(
-        left=full_df,
-        right=filtermap_df,
-        how="inner",
-        left_on=prefixb,
-        right_on=prefixa + "_id",
-    )
+        # Include MP term
+        full_df = pd.merge(
+            left=full_df,
+            right=filtermap_df,
+            how="inner",
+            left_on=prefixb,
+            right_on=prefixa + "_id",
+        )
 
-    # TODO: Include subsumer term
+        # TODO: Include subsumer term
 
-    # Clean up the df before writing
-    # Also do some reformatting to match expected
-    full_df.drop(columns=[prefixb, prefixa + "_id"], inplace=True)
-    full_df.rename({prefixb + "_id": prefixb}, axis=1, inplace=True)
-    full_df.insert(1, prefixb, full_df.pop(prefixb))
-    for col in [prefixa, prefixb]:
-        full_df[col] = full_df[col].str.replace(":", "_")
+        # Clean up the df before writing
+        # Also do some reformatting to match expected
+        full_df.drop(columns=[prefixb, prefixa + "_id"], inplace=True)
+        full_df.rename({prefixb + "_id": prefixb}, axis=1, inplace=True)
+        full_df.insert(1, prefixb, full_df.pop(prefixb))
+        for col in [prefixa, prefixb]:
+            full_df[col] = full_df[col].str.replace(":", "_")
 
-    full_df.to_csv(outpath, index=False, header=False, sep="\t")
+    with profile_stage(profile_dir, "write"):
+        full_df.to_csv(outpath, index=False, header=False, sep="\t")
 
     if len(error_data) > 0:
         print("The following terms had errors:")
@@ -0,0 +1,236 @@
+"""Stage graphs on local disk and load them without network access."""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import urllib.request
+from typing import TYPE_CHECKING, Dict, Optional
+
+from .datasets import (
+    GRAPE_DATASETS_MOD,
+    get_graph_repository,
+    load_graph_metadata,
+)
+
+if TYPE_CHECKING:
+    from grape import Graph
+
+# grape is imported within functions that need it,
+# so finding an index in the store does not import it.
+
+MANIFEST_NAME = "manifest.json"
+INDEX_PREFIX = "index-"
+UNINDEXABLE_SUFFIX = ".unindexable"
+
+
+def load_manifest(store_dir: str) -> dict:
+    """Load the manifest of a graph store.
+
+    :param store_dir: str, path to graph store directory
+    :return: dict of graph name to dict of version to
+    a dict with the path (relative to the store),
+    sha256 checksum and source of the staged graph file,
+    and the path and sha256 checksum of each of the node
+    and edge lists extracted from it
+    """
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(store_dir: str, manifest: dict) -> None:
+    """Write the manifest of a graph store.
+
+    :param store_dir: str, path to graph store directory
+    :param manifest: dict, as from load_manifest
+    :return: None
+    """
+    manifest_path = os.path.join(store_dir, MANIFEST_NAME)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+
+def get_sha256(path: str) -> str:
+    """Compute the sha256 checksum of a file.
+
+    :param path: str, path to file
+    :return: str, hex digest
+    """
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_graph_url(name: str, version: str) -> str:
+    """Find where a version of a KG-OBO or KG-Hub graph is hosted.
+
+    This uses the graph metadata distributed with grape,
+    so it does not need network access.
+    :param name: str, name of graph, e.g. HP
+    :param version: str, version of graph, e.g. 2022-06-11
+    :return: str, URL of the compressed KGX TSV node and edge files
+    """
+    repository = get_graph_repository(name)
+    metadata = load_graph_metadata(repository)
+
+    try:
+        return metadata[name][version]["urls"][0]
+    except KeyError:
+        raise ValueError(
+            f"Cannot find version {version} of {name}"
+            f" in {GRAPE_DATASETS_MOD}.{repository}."
+        )
+
+
+def stage_graph(
+    store_dir: str,
+    name: str,
+    version: str,
+    input_file: Optional[str] = None,
+) -> str:
+    """Add a graph to a graph store.
+
+    :param store_dir: str, path to graph store directory
+    :param name: str, name of graph, e.g. HP
+    :param version: str, version of graph, e.g. 2022-06-11
+    :param input_file: str, path to a tar.gz compressed file containing
+    KGX TSV node and edge files. If not provided, the file will be
+    downloaded from KG-OBO or KG-Hub.
+    :return: str, path to the staged file
+    """
+    from .utils import extract_graph_files
+
+    source = input_file if input_file else get_graph_url(name, version)
+    relative_path = os.path.join(name, version, os.path.basename(source))
+    outpath = os.path.join(store_dir, relative_path)
+    os.makedirs(os.path.dirname(outpath), exist_ok=True)
+
+    if input_file:
+        if not os.path.isfile(input_file):
+            raise FileNotFoundError(f"Cannot find input file: {input_file}")
+        print(f"Copying {input_file} to {outpath}...")
+        shutil.copyfile(input_file, outpath)
+    else:
+        print(f"Downloading {source} to {outpath}...")
+        with urllib.request.urlopen(source) as response:  # noqa: S310
+            with open(outpath, "wb") as outfile:
+                shutil.copyfileobj(response, outfile)
+
+    # Extract the node and edge lists once, so loading the graph
+    # does not decompress it or write to the store.
+    print(f"Extracting node and edge lists from {outpath}...")
+    extracted = extract_graph_files(outpath, os.path.dirname(outpath))
+    files = {}
+    for key, path in extracted.items():
+        if not path:
+            raise ValueError(f"Cannot find {key.lower()} list in {source}.")
+        files[key.lower()] = {
+            "path": os.path.relpath(path, store_dir),
+            "sha256": get_sha256(path),
+        }
+
+    manifest = load_manifest(store_dir)
+    manifest.setdefault(name, {})[version] = {
+        "path": relative_path,
+        "sha256": get_sha256(outpath),
+        "source": source,
+        "files": files,
+    }
+    save_manifest(store_dir, manifest)
+
+    return outpath
+
+
+def get_staged_graph_files(
+    store_dir: str, name: str, version: str
+) -> Dict[str, str]:
+    """Find the node and edge lists of a staged graph and check them.
+
+    :param store_dir: str, path to graph store directory
+    :param name: str, name of graph, e.g. HP
+    :param version: str, version of graph, e.g. 2022-06-11
+    :return: dict with the paths of the "nodes" and "edges" lists
+    """
+    manifest = load_manifest(store_dir)
+    if name not in manifest:
+        raise ValueError(f"{name} is not staged in {store_dir}.")
+    if version not in manifest[name]:
+        raise ValueError(
+            f"Version {version} of {name} is not staged in {store_dir}."
+            f" Staged versions: {', '.join(sorted(manifest[name]))}"
+        )
+
+    entry = manifest[name][version]
+    if "files" not in entry:
+        raise ValueError(
+            f"Version {version} of {name} was staged without extracting"
+            " its node and edge lists; try staging it again."
+        )
+
+    paths = {}
+    for key, file_entry in entry["files"].items():
+        path = os.path.join(store_dir, file_entry["path"])
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Cannot find staged graph file: {path}")
+        if get_sha256(path) != file_entry["sha256"]:
+            raise ValueError(
+                f"Checksum of {path} does not match the manifest."
+                " The file may be corrupt; try staging it again."
+            )
+        paths[key] = path
+
+    return paths
+
+
+def load_staged_graph(store_dir: str, name: str, version: str) -> "Graph":
+    """Load a graph from a graph store, without network access.
+
+    The node and edge lists extracted when the graph was staged
+    are loaded, so nothing is written to the store.
+    :param store_dir: str, path to graph store directory
+    :param name: str, name of graph, e.g. HP
+    :param version: str, version of graph, e.g. 2022-06-11
+    :return: Graph
+    """
+    from .utils import load_graph_files
+
+    paths = get_staged_graph_files(store_dir, name, version)
+    print(f"Loading version {version} of {name} from {store_dir}.")
+    return load_graph_files(name, paths["nodes"], paths["edges"])
+
+
+def get_index_path(
+    store_dir: str, name: str, version: str, predicate: str
+) -> str:
+    """Find where the query index of a staged graph is cached.
+
+    The index is named for the checksum of the graph it was built
+    from, so staging the graph again invalidates it, and for the
+    predicate its edges were filtered to. The graph file itself is
+    not read, so a cached index is found quickly.
+    If the graph cannot be indexed, a file with the same path plus
+    UNINDEXABLE_SUFFIX records why.
+    :param store_dir: str, path to graph store directory
+    :param name: str, name of graph, e.g. HP
+    :param version: str, version of graph, e.g. 2022-06-11
+    :param predicate: str, predicate type the index is filtered to
+    :return: str, path to the index directory, which may not exist yet
+    """
+    manifest = load_manifest(store_dir)
+    if version not in manifest.get(name, {}):
+        raise ValueError(
+            f"Version {version} of {name} is not staged in {store_dir}."
+        )
+    entry = manifest[name][version]
+    return os.path.join(
+        store_dir,
+        os.path.dirname(entry["path"]),
+        f"{INDEX_PREFIX}{entry['sha256'][:16]}"
+        f"-{re.sub(r'[^A-Za-z0-9]', '_', predicate)}",
+    )
@@ -0,0 +1,279 @@
+"""Compute similarity measures from shared per-pair statistics.
+
+Each measure is a function of the statistics returned by
+`get_pair_statistics`, registered by name in `MEASURES`, so any
+selection of measures is computed from a single pass over the
+ancestors of each pair.
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MEASURES: Dict[str, Callable[[Dict[str, np.ndarray]], np.ndarray]] = {}
+
+
+def register_measure(name: str) -> Callable:
+    """Register a similarity measure under a name.
+
+    Parameters
+    -------------------
+    name: str
+        Name of the measure, used as its column name in output.
+    return: Callable
+        Decorator registering a function of pair statistics.
+    """
+
+    def decorator(
+        measure: Callable[[Dict[str, np.ndarray]], np.ndarray]
+    ) -> Callable[[Dict[str, np.ndarray]], np.ndarray]:
+        MEASURES[name] = measure
+        return measure
+
+    return decorator
+
+
+def get_pair_ancestor_keys(
+    indptr: np.ndarray, indices: np.ndarray, node_ids: np.ndarray
+) -> np.ndarray:
+    """Expand the ancestors of nodes into (pair, ancestor) keys.
+
+    Parameters
+    -------------------
+    indptr: np.ndarray
+        Offsets of the ancestor closure, as from `get_ancestor_closure`.
+    indices: np.ndarray
+        Ancestors of the ancestor closure, as from `get_ancestor_closure`.
+    node_ids: np.ndarray
+        ID of one node of each pair.
+    return: np.ndarray
+        Sorted keys of pair index times the number of nodes plus
+        ancestor ID, for each ancestor of each node.
+    """
+    number_of_nodes = len(indptr) - 1
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+    starts = indptr[node_ids]
+    counts = indptr[node_ids + 1] - starts
+    positions = np.arange(counts.sum()) + np.repeat(
+        starts - np.cumsum(counts) + counts, counts
+    )
+    pair_ids = np.repeat(np.arange(len(node_ids)), counts)
+    return pair_ids * number_of_nodes + indices[positions]
+
+
+def get_ancestor_information_contents(
+    ancestor_closure: Tuple[np.ndarray, np.ndarray],
+    information_contents: np.ndarray,
+) -> np.ndarray:
+    """Sum the information content of the ancestors of each node.
+
+    Parameters
+    -------------------
+    ancestor_closure: Tuple[np.ndarray, np.ndarray]
+        The ancestor closure of the DAG, as from `get_ancestor_closure`.
+    information_contents: np.ndarray
+        The information content of each node.
+    return: np.ndarray
+        The summed information content of each node's ancestors.
+    """
+    indptr, indices = ancestor_closure
+    number_of_nodes = len(indptr) - 1
+    return np.bincount(
+        np.repeat(np.arange(number_of_nodes), np.diff(indptr)),
+        weights=np.asarray(information_contents, dtype=np.float64)[indices],
+        minlength=number_of_nodes,
+    )
+
+
+def get_pair_statistics(
+    ancestor_closure: Tuple[np.ndarray, np.ndarray],
+    information_contents: np.ndarray,
+    sources: np.ndarray,
+    destinations: np.ndarray,
+    ancestor_ics: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """Compute the quantities similarity measures are built from.
+
+    Parameters
+    -------------------
+    ancestor_closure: Tuple[np.ndarray, np.ndarray]
+        The ancestor closure of the DAG, as from `get_ancestor_closure`.
+    information_contents: np.ndarray
+        The information content of each node.
+    sources: np.ndarray
+        Node IDs of the first node in each pair.
+    destinations: np.ndarray
+        Node IDs of the second node in each pair.
+    ancestor_ics: np.ndarray
+        The summed information content of each node's ancestors, as
+        from `get_ancestor_information_contents`, e.g. shared between
+        chunks of pairs. If not provided, it will be computed.
+    return: Dict[str, np.ndarray]
+        For each pair: the information content of the most informative
+        common ancestor (mica_ic) and of each node (source_ic,
+        destination_ic), the number of ancestors of each node
+        (source_size, destination_size), shared by both
+        (intersection_size) and of either (union_size), and the
+        summed information content of those shared (intersection_ic)
+        and of either (union_ic).
+    """
+    indptr, indices = ancestor_closure
+    number_of_nodes = len(indptr) - 1
+    number_of_pairs = len(sources)
+    sources = np.asarray(sources, dtype=np.int64)
+    destinations = np.asarray(destinations, dtype=np.int64)
+    information_contents = np.asarray(information_contents, dtype=np.float64)
+
+    shared = np.intersect1d(
+        get_pair_ancestor_keys(indptr, indices, sources),
+        get_pair_ancestor_keys(indptr, indices, destinations),
+        assume_unique=True,
+    )
+    shared_pairs = shared // number_of_nodes
+    shared_ics = information_contents[shared % number_of_nodes]
+
+    mica_ic = np.zeros(number_of_pairs)
+    np.maximum.at(mica_ic, shared_pairs, shared_ics)
+
+    sizes = np.diff(indptr)
+    if ancestor_ics is None:
+        ancestor_ics = get_ancestor_information_contents(
+            ancestor_closure, information_contents
+        )
+    intersection_size = np.bincount(shared_pairs, minlength=number_of_pairs)
+    intersection_ic = np.bincount(
+        shared_pairs, weights=shared_ics, minlength=number_of_pairs
+    )
+
+    return {
+        "mica_ic": mica_ic,
+        "source_ic": information_contents[sources],
+        "destination_ic": information_contents[destinations],
+        "source_size": sizes[sources],
+        "destination_size": sizes[destinations],
+        "intersection_size": intersection_size,
+        "union_size": (
+            sizes[sources] + sizes[destinations] - intersection_size
+        ),
+        "intersection_ic": intersection_ic,
+        "union_ic": (
+            ancestor_ics[sources] + ancestor_ics[destinations]
+            - intersection_ic
+        ),
+    }
+
+
+def safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divide, giving zero where the denominator is zero."""
+    return np.divide(
+        numerator,
+        denominator,
+        out=np.zeros(len(numerator)),
+        where=denominator != 0,
+    )
+
+
+@register_measure("resnik")
+def get_resnik_similarities(stats: Dict[str, np.ndarray]) -> np.ndarray:
+    """Resnik: the IC of the most informative common ancestor."""
+    return stats["mica_ic"]
+
+
+@register_measure("lin")
+def get_lin_similarities(stats: Dict[str, np.ndarray]) -> np.ndarray:
+    """Lin: twice the MICA IC over the summed IC of both nodes."""
+    return safe_divide(
+        2 * stats["mica_ic"], stats["source_ic"] + stats["destination_ic"]
+    )
+
+
+@register_measure("jiang_conrath")
+def get_jiang_conrath_similarities(
+    stats: Dict[str, np.ndarray]
+) -> np.ndarray:
+    """Jiang-Conrath: one over one plus the Jiang-Conrath distance."""
+    distance = (
+        stats["source_ic"] + stats["destination_ic"] - 2 * stats["mica_ic"]
+    )
+    return 1 / (1 + np.maximum(distance, 0))
+
+
+@register_measure("simgic")
+def get_simgic_similarities(stats: Dict[str, np.ndarray]) -> np.ndarray:
+    """SimGIC: IC-weighted Jaccard similarity of the ancestors."""
+    return safe_divide(stats["intersection_ic"], stats["union_ic"])
+
+
+@register_measure("cosine")
+def get_cosine_similarities(stats: Dict[str, np.ndarray]) -> np.ndarray:
+    """Cosine similarity of the binary ancestor vectors."""
+    return safe_divide(
+        stats["intersection_size"].astype(np.float64),
+        np.sqrt(stats["source_size"] * stats["destination_size"]),
+    )
+
+
+def check_measures(measures: List[str]) -> None:
+    """Raise a ValueError if any measure is not registered.
+
+    Parameters
+    -------------------
+    measures: List[str]
+        Names of measures.
+    return: None
+    """
+    unknown = [measure for measure in measures if measure not in MEASURES]
+    if unknown:
+        raise ValueError(
+            f"Unknown measures: {', '.join(unknown)}. "
+            f"Available measures are {', '.join(MEASURES)}."
+        )
+
+
+def compute_measures(
+    ancestor_closure: Tuple[np.ndarray, np.ndarray],
+    information_contents: np.ndarray,
+    sources: np.ndarray,
+    destinations: np.ndarray,
+    measures: List[str],
+    chunk_size: int = 100_000,
+) -> Dict[str, np.ndarray]:
+    """Compute similarity measures for pairs of nodes.
+
+    Parameters
+    -------------------
+    ancestor_closure: Tuple[np.ndarray, np.ndarray]
+        The ancestor closure of the DAG, as from `get_ancestor_closure`.
+    information_contents: np.ndarray
+        The information content of each node.
+    sources: np.ndarray
+        Node IDs of the first node in each pair.
+    destinations: np.ndarray
+        Node IDs of the second node in each pair.
+    measures: List[str]
+        Names of registered measures to compute.
+    chunk_size: int
+        Number of pairs to process at once, to bound memory use.
+    return: Dict[str, np.ndarray]
+        Similarities of each pair, by measure.
+    """
+    check_measures(measures)
+    similarities = {
+        measure: np.zeros(len(sources), dtype=np.float32)
+        for measure in measures
+    }
+    ancestor_ics = get_ancestor_information_contents(
+        ancestor_closure, information_contents
+    )
+    for start in range(0, len(sources), chunk_size):
+        stop = start + chunk_size
+        stats = get_pair_statistics(
+            ancestor_closure,
+            information_contents,
+            sources[start:stop],
+            destinations[start:stop],
+            ancestor_ics,
+        )
+        for measure in measures:
+            similarities[measure][start:stop] = MEASURES[measure](stats)
+    return similarities
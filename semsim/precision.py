@@ -0,0 +1,107 @@
+"""Store similarity scores at reduced precision."""
+
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+SIM_PRECISIONS = ["float32", "uint16"]
+PHENODIGM_PRECISIONS = ["float64", "float32"]
+SCALES_SUFFIX = "_scales.json"
+UINT16_MAX = np.iinfo(np.uint16).max
+
+
+def get_scales_path(path: str) -> str:
+    """Get the path of the scales written alongside quantized scores.
+
+    :param path: str, path to similarity file
+    :return: str, path to scales file
+    """
+    return f"{path}{SCALES_SUFFIX}"
+
+
+def quantize_scores(
+    df: pd.DataFrame, columns: List[str]
+) -> Dict[str, float]:
+    """Replace scores with uint16 values, in place.
+
+    Each column is scaled so its maximum maps to the largest uint16,
+    so the stored value times the scale is within half a scale unit
+    of the original score.
+    :param df: pandas df of similarities
+    :param columns: list of names of columns with scores
+    :return: dict of column name to scale
+    """
+    scales = {}
+    for col in columns:
+        maximum = float(df[col].max()) if len(df) > 0 else 0.0
+        scale = maximum / UINT16_MAX if maximum > 0 else 1.0
+        df[col] = np.round(df[col].to_numpy() / scale).astype(np.uint16)
+        scales[col] = scale
+    return scales
+
+
+def write_scales(path: str, scales: Dict[str, float]) -> None:
+    """Write the scales for a file of quantized scores.
+
+    :param path: str, path to similarity file
+    :param scales: dict of column name to scale
+    :return: None
+    """
+    with open(get_scales_path(path), "w") as scales_file:
+        json.dump(scales, scales_file)
+
+
+def read_similarities(path: str) -> pd.DataFrame:
+    """Load a similarity file written by compute_pairwise_sims.
+
+    Scores are loaded as float32. If the scores were quantized,
+    they are scaled back to their original range.
+    :param path: str, path to similarity file
+    :return: pandas df of similarities
+    """
+    header = pd.read_csv(path, sep=",", nrows=0).columns
+    score_columns = [
+        col for col in header if col not in ["source", "destination"]
+    ]
+
+    scales = {}
+    if os.path.exists(get_scales_path(path)):
+        with open(get_scales_path(path), "r") as scales_file:
+            scales = json.load(scales_file)
+
+    df = pd.read_csv(
+        path,
+        sep=",",
+        engine="c",
+        dtype={
+            col: np.uint16 if col in scales else np.float32
+            for col in score_columns
+        },
+    )
+    for col, scale in scales.items():
+        df[col] = (df[col].to_numpy() * scale).astype(np.float32)
+
+    return df
+
+
+def read_score_matrix(path: str, precision: str) -> pd.DataFrame:
+    """Load a matrix of scores, with term IDs in the first column.
+
+    :param path: str, path to score matrix
+    :param precision: str, float64 or float32
+    :return: pandas df of scores
+    """
+    if precision not in PHENODIGM_PRECISIONS:
+        raise ValueError(
+            f"Precision must be one of {', '.join(PHENODIGM_PRECISIONS)}."
+        )
+    header = pd.read_csv(path, sep=",", nrows=0).columns
+    return pd.read_csv(
+        path,
+        sep=",",
+        engine="c",
+        dtype={col: precision for col in header[1:]},
+    )
@@ -1,29 +1,52 @@
 """Process ontology and retrieve pairwise similarities."""
+import importlib
+import os
+import shutil
 import sys
-import warnings
+import tempfile
 from collections import Counter
-from typing import Union
+from typing import Callable, Optional, Union
 
 import pandas as pd
+from grape import Graph
+from grape.similarities import DAGResnik
 
+from .ancestors import get_ancestor_closure
 from .compute_pairwise_similarities import compute_pairwise_sims, compute_subset_sims # NOQA
+from .datasets import GRAPE_DATASETS_MOD, get_graph_repository
 from .extra_prefixes import PREFIXES # NOQA
+from .graph_store import (
+    UNINDEXABLE_SUFFIX,
+    get_index_path,
+    load_staged_graph,
+)
+from .profiling import profile_stage
+from .shared_model import compute_shared_subset_sims, save_shared_model
 from .utils import load_local_graph
+from .validation import validate_dag
 
-GRAPE_DATA_MOD = "grape.datasets.kgobo"
+VALIDATION_CACHE_NAME = "validation.json"
 
 
 def get_similarities(
     ontology: str,
     cutoff: float,
-    annot_file: str,
-    annot_col: str,
-    output_dir: str,
+    annot_file: Optional[str],
+    annot_col: Optional[str],
+    output_dir: Optional[str],
     nodes: list,
     predicate: str,
     root_node: str,
     subset: bool,
-    input_file: str = None
+    input_file: Optional[str] = None,
+    prune: bool = False,
+    graph_store: Optional[str] = None,
+    graph_version: Optional[str] = None,
+    repair: bool = False,
+    shared_model: Optional[str] = None,
+    precision: str = "float32",
+    measures: Optional[list] = None,
+    profile_dir: Optional[str] = None,
 ) -> Union[bool, dict]:
     """Compute and store similarities to the provided paths.
 
@@ -37,6 +60,23 @@ def get_similarities(
     specifically for Jaccard calculations
     :param subset: bool, if True, process to prepare single
     pair of similarities only
+    :param input_file: path to a tar.gz compressed file containing
+    KGX TSV node and edge files
+    :param prune: bool, if True, skip pairs of nodes that cannot
+    meet the Resnik cutoff rather than comparing all pairs
+    :param graph_store: str, path to a graph store directory to
+    load the ontology from, without network access
+    :param graph_version: str, version of the ontology to load
+    from the graph store
+    :param repair: bool, if True, drop self loops and edges closing
+    cycles rather than exiting or warning
+    :param shared_model: str, directory to also write the fitted model
+    to, for scoring by other processes
+    :param precision: str, float32 or uint16, how to store scores
+    :param measures: list of additional similarity measures to compute,
+    e.g. lin, jiang_conrath, simgic or cosine
+    :param profile_dir: str, if provided, profile each stage and
+    write the profiles to this directory
     :return: True if successful and not working on a subset.
     Otherwise returns a dict of tuples, with the IDs of each pair
     (a tuple) as the key and a tuple of (Resnik, Jaccard) as value.
@@ -46,81 +86,272 @@ def get_similarities(
     """
     success = True
 
-    if not input_file:
-        onto_graph_class = import_grape_class(ontology)
-        onto_graph = (
-            onto_graph_class(directed=True)
-            .remove_disconnected_nodes()
-            .to_transposed()
-        )
-    else:
-        onto_graph = (
-            load_local_graph(ontology, input_file)
-            .remove_disconnected_nodes()
-            .to_transposed()
+    with profile_stage(profile_dir, "load_graph"):
+        onto_graph = load_graph(
+            ontology=ontology,
+            input_file=input_file,
+            graph_store=graph_store,
+            graph_version=graph_version,
         )
 
     if not subset:
         focus_prefixes = [prefix for prefix in nodes]
+        with profile_stage(profile_dir, "filter_graph"):
+            onto_graph = filter_graph(
+                onto_graph, prefixes=focus_prefixes, predicate=predicate
+            )
+
+    try:
+        with profile_stage(profile_dir, "validate_dag"):
+            onto_graph = validate_dag(
+                onto_graph,
+                repair=repair,
+                cache_path=(
+                    os.path.join(graph_store, VALIDATION_CACHE_NAME)
+                    if graph_store
+                    else None
+                ),
+            )
+    except ValueError as e:
+        sys.exit(f"{e} Exiting...")
 
-        # Some prefixes are helpful for traversing the graph,
-        # but don't need to be included in the final simlarities.
-        all_extra_prefixes = PREFIXES
-        traversal_prefixes = [f"{prefix}:" for prefix in nodes]
+    with profile_stage(profile_dir, "get_counts"):
+        counts = get_counts(onto_graph, annot_file, annot_col)
 
-        print(
-            "Comparing nodes with these prefixes: "
-            f" {' '.join(focus_prefixes)}"
-        )
+    if not subset:
+        if output_dir is None:
+            raise ValueError("Need output_dir unless computing a subset.")
+        if not compute_pairwise_sims(
+            dag=onto_graph,
+            counts=counts,
+            cutoff=cutoff,
+            path=output_dir,
+            prefixes=focus_prefixes,
+            root_node=root_node,
+            prune=prune,
+            shared_model_path=shared_model,
+            precision=precision,
+            measures=measures,
+            profile_dir=profile_dir,
+        ):
+            print("Similarity computation failed.")
+            success = False
+
+        return success
+    else:
+        with profile_stage(profile_dir, "subset_sims"):
+            sims = compute_subset_sims(
+                dag=onto_graph,
+                counts=counts,
+                nodes=nodes,
+            )
+        return sims
 
-    onto_graph = (
-        onto_graph_class(directed=True)
-        .remove_disconnected_nodes()
-        .to_transposed()
+
+def get_query_similarities(
+    ontology: str,
+    nodes: list,
+    predicate: str,
+    graph_store: str,
+    graph_version: str,
+    profile_dir: Optional[str] = None,
+) -> dict:
+    """Compute similarities between nodes of a staged graph.
+
+    The query index of the graph is built and cached on first use,
+    so later queries need only extract and score the ancestors of
+    their nodes. Graphs that cannot be indexed are scored from the
+    graph loaded for the attempt, and are not indexed again.
+    :param ontology: str, name of ontology in the graph store
+    :param nodes: list of no fewer than two nodes
+    to find similarity between
+    :param predicate: str, predicate type to filter to
+    :param graph_store: str, path to a graph store directory
+    :param graph_version: str, version of the ontology to query
+    :param profile_dir: str, if provided, profile each stage and
+    write the profiles to this directory
+    :return: dict of tuples, with the IDs of each pair (a tuple) as
+    the key and a tuple of (Resnik, Jaccard) as value.
+    """
+    index_path = get_index_path(
+        graph_store, ontology, graph_version, predicate
     )
+    if not os.path.isdir(index_path):
+        with profile_stage(profile_dir, "load_graph"):
+            onto_graph = load_query_graph(
+                ontology, graph_store, graph_version, predicate
+            )
+        if os.path.exists(f"{index_path}{UNINDEXABLE_SUFFIX}"):
+            print(f"Graph cannot be indexed, see {index_path}.")
+            indexed = False
+        else:
+            print(f"Building query index at {index_path}...")
+            with profile_stage(profile_dir, "build_index"):
+                indexed = build_query_index(onto_graph, index_path)
+        if not indexed:
+            with profile_stage(profile_dir, "subset_sims"):
+                return compute_subset_sims(
+                    dag=onto_graph,
+                    counts=get_counts(onto_graph, None, None),
+                    nodes=nodes,
+                )
+
+    with profile_stage(profile_dir, "shared_subset_sims"):
+        return compute_shared_subset_sims(index_path, nodes)
 
-    if not subset:
-        all_node_prefixes = set(
-            [(name.split(":"))[0] for name in onto_graph.get_node_names()]
-        )
 
-        print("Also traversing nodes with these prefixes: ")
-        new_prefixes = 0
-        for prefix in all_extra_prefixes:
-            if prefix in all_node_prefixes and prefix not in focus_prefixes:
-                traversal_prefixes.append(f"{prefix}:")
-                new_prefixes = new_prefixes + 1
-        if new_prefixes == 0:
-            print("(None, just the input prefixes.)")
-
-        onto_graph = onto_graph.filter_from_names(
-            edge_type_names_to_keep=[predicate],
-            node_prefixes_to_keep=traversal_prefixes,
+def load_query_graph(
+    ontology: str, graph_store: str, graph_version: str, predicate: str
+) -> Graph:
+    """Load a staged graph for queries, as for its query index.
+
+    Only edges of the given predicate are kept, as edges of other
+    predicates often form cycles, e.g. in KG-Hub graphs.
+    :param ontology: str, name of ontology in the graph store
+    :param graph_store: str, path to a graph store directory
+    :param graph_version: str, version of the ontology to load
+    :param predicate: str, predicate type to filter to
+    :return: Graph, validated as by get_similarities
+    """
+    onto_graph = load_graph(
+        ontology=ontology,
+        graph_store=graph_store,
+        graph_version=graph_version,
+    ).filter_from_names(edge_type_names_to_keep=[predicate])
+    try:
+        return validate_dag(
+            onto_graph,
+            cache_path=os.path.join(graph_store, VALIDATION_CACHE_NAME),
         )
+    except ValueError as e:
+        sys.exit(f"{e} Exiting...")
+
+
+def build_query_index(onto_graph: Graph, index_path: str) -> bool:
+    """Build the query index of a graph.
+
+    The index is a shared model of the whole graph, so queries need
+    only extract and score the ancestors of their nodes. Graphs with
+    cycles cannot be indexed; for these, the reason is written next
+    to the index path instead, so later queries do not try again.
+    :param onto_graph: Graph, as from load_query_graph
+    :param index_path: str, path to write the index directory to,
+    as from get_index_path
+    :return: bool, True if the index was written
+    """
+    try:
+        ancestor_closure = get_ancestor_closure(onto_graph)
+    except ValueError as e:
+        print(f"Cannot build query index: {e}")
+        with open(f"{index_path}{UNINDEXABLE_SUFFIX}", "w") as outfile:
+            outfile.write(f"{e}\n")
+        return False
+
+    resnik_model = DAGResnik()
+    resnik_model.fit(
+        onto_graph, node_counts=get_counts(onto_graph, None, None)
+    )
 
+    # Write to a temporary directory first, so other processes
+    # never see a partially written index.
+    temp_path = tempfile.mkdtemp(
+        dir=os.path.dirname(index_path), prefix=".index-"
+    )
     try:
-        onto_graph.must_be_connected()
-    except ValueError:
-        comps = onto_graph.get_number_of_connected_components()
-        num_comps = comps[0]
-        max_comp = comps[2]
-        warnings.warn(
-            "Graph contains multiple disconnected components."
-            " Will ignore all but the largest component."
-            f" {num_comps} components are present."
-            f" Largest component has {max_comp} nodes."
+        save_shared_model(
+            onto_graph, resnik_model, temp_path, ancestor_closure
         )
-        onto_graph = onto_graph.remove_components(top_k_components=1)
-
-    if not onto_graph.is_directed_acyclic():
-        warnings.warn("Graph is not directed acyclic.")
-        if onto_graph.has_selfloops():
-            sys.exit(
-                "Self loops are present."
-                " Cannot complete similarity measurement."
-                " Exiting..."
-            )
+        os.rename(temp_path, index_path)
+    except OSError:
+        # Another process has written the index already
+        if not os.path.isdir(index_path):
+            raise
+    finally:
+        if os.path.isdir(temp_path):
+            shutil.rmtree(temp_path)
+
+    return True
+
+
+def load_graph(
+    ontology: str,
+    input_file: Optional[str] = None,
+    graph_store: Optional[str] = None,
+    graph_version: Optional[str] = None,
+) -> Graph:
+    """Load a graph, oriented from its root(s) down.
+
+    :param ontology: str, name of ontology to retrieve and process.
+    :param input_file: path to a tar.gz compressed file containing
+    KGX TSV node and edge files
+    :param graph_store: str, path to a graph store directory to
+    load the ontology from, without network access
+    :param graph_version: str, version of the ontology to load
+    from the graph store
+    :return: Graph, without disconnected nodes
+    """
+    if graph_store:
+        if not graph_version:
+            raise ValueError("Need graph_version if using a graph_store.")
+        onto_graph = load_staged_graph(graph_store, ontology, graph_version)
+    elif not input_file:
+        onto_graph_class = import_grape_class(ontology)
+        onto_graph = onto_graph_class(directed=True)
+    else:
+        onto_graph = load_local_graph(ontology, input_file)
+
+    return onto_graph.remove_disconnected_nodes().to_transposed()
+
+
+def filter_graph(onto_graph: Graph, prefixes: list, predicate: str) -> Graph:
+    """Filter a graph to the nodes and edges to compare.
+
+    :param onto_graph: Graph, as from load_graph
+    :param prefixes: list of prefixes, without colons, to keep the
+    corresponding nodes for
+    :param predicate: str, predicate type to filter to
+    :return: Graph
+    """
+    # Some prefixes are helpful for traversing the graph,
+    # but don't need to be included in the final simlarities.
+    all_extra_prefixes = PREFIXES
+    traversal_prefixes = [f"{prefix}:" for prefix in prefixes]
+
+    print(
+        "Comparing nodes with these prefixes: "
+        f" {' '.join(prefixes)}"
+    )
+
+    all_node_prefixes = set(
+        [(name.split(":"))[0] for name in onto_graph.get_node_names()]
+    )
+
+    print("Also traversing nodes with these prefixes: ")
+    new_prefixes = 0
+    for prefix in all_extra_prefixes:
+        if prefix in all_node_prefixes and prefix not in prefixes:
+            traversal_prefixes.append(f"{prefix}:")
+            new_prefixes = new_prefixes + 1
+    if new_prefixes == 0:
+        print("(None, just the input prefixes.)")
 
+    return onto_graph.filter_from_names(
+        edge_type_names_to_keep=[predicate],
+        node_prefixes_to_keep=traversal_prefixes,
+    )
+
+
+def get_counts(
+    dag: Graph, annot_file: Optional[str], annot_col: Optional[str]
+) -> dict:
+    """Get the counts of each node to use for Resnik similarity.
+
+    :param dag: Graph, the DAG to get counts for
+    :param annot_file: path to an annotation file, if using specific
+    frequencies for Resnik calculation
+    :param annot_col: name of column in annotation file containing onto IDs
+    :return: dict of node name to count
+    """
     if annot_file:
         counts = dict(
             Counter(
@@ -128,7 +359,7 @@ def get_similarities(
                     annot_file,
                     sep="\t",
                     skiprows=4,
-                ).annot_col
+                )[annot_col]
             )
         )
     else:
@@ -137,45 +368,28 @@ def get_similarities(
 
         counts = dict(
             zip(
-                onto_graph.get_node_names(),
-                [1] * len(onto_graph.get_node_names()),
+                dag.get_node_names(),
+                [1] * len(dag.get_node_names()),
             )
         )
 
-    if not subset:
-        if not compute_pairwise_sims(
-            dag=onto_graph,
-            counts=counts,
-            cutoff=cutoff,
-            path=output_dir,
-            prefixes=focus_prefixes,
-            root_node=root_node,
-        ):
-            print("Similarity computation failed.")
-            success = False
-
-        return success
-    else:
-        sims = compute_subset_sims(
-            dag=onto_graph,
-            counts=counts,
-            nodes=nodes,
-        )
-        return sims
+    return counts
 
 
-def import_grape_class(name) -> object:
+def import_grape_class(name) -> Callable[..., Graph]:
     """Dynamically import a Grape class based on its reference.
 
-    It's assumed to be part of KG-OBO, but if not, it will
-    look in KG-Hub instead.
-    :param reference: The reference or path for the class to be imported.
+    The repository providing it (KG-OBO or KG-Hub) is looked up
+    by name, but if it isn't found there, it will look in
+    KG-Hub instead.
+    :param name: The name of the graph to be imported.
     :return: The imported class
     """
-    mod = __import__(GRAPE_DATA_MOD, fromlist=[name])
+    repository = get_graph_repository(name)
+    mod = importlib.import_module(f"{GRAPE_DATASETS_MOD}.{repository}")
     try:
         this_class = getattr(mod, name)
     except AttributeError:
-        mod = __import__("grape.datasets.kghub", fromlist=[name])
+        mod = importlib.import_module(f"{GRAPE_DATASETS_MOD}.kghub")
         this_class = getattr(mod, name)
     return this_class
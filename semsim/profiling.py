@@ -0,0 +1,129 @@
+"""Profile the stages of the pipeline."""
+
+import cProfile
+import os
+import pstats
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+PROFILE_SUFFIX = ".prof"
+COLLAPSED_SUFFIX = ".collapsed"
+# Collapsed stacks are weighted in microseconds
+COLLAPSED_UNIT = 1e-6
+
+Function = Tuple[str, int, str]
+
+
+def get_function_label(function: Function) -> str:
+    """Name a profiled function for a collapsed stack.
+
+    :param function: tuple of file name, line and function name,
+    as keyed in pstats
+    :return: str, the function name with its file and line,
+    or just its name for built-in and compiled functions
+    """
+    filename, line, name = function
+    if filename == "~":
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def get_collapsed_stacks(stats: pstats.Stats) -> Counter:
+    """Estimate the time spent in each stack from a profile.
+
+    cProfile records time per function and per caller, rather than
+    per stack, so each function's time is split between the stacks
+    it is reached by in proportion to the time of each call. Calls
+    into compiled code, e.g. grape, are timed by cProfile like any
+    other, so their time is attributed to them rather than lost.
+    :param stats: Stats of a profile
+    :return: Counter of stacks, each a tuple of function labels from
+    the outermost function in, to their time in microseconds
+    """
+    entries = stats.stats  # type: ignore[attr-defined]
+    callees: Dict[Function, Dict[Function, float]] = defaultdict(dict)
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees[caller][function] = cumulative
+
+    stacks: Counter = Counter()
+
+    def descend(function: Function, path: tuple, time_spent: float) -> None:
+        _, _, own, cumulative, _ = entries[function]
+        if time_spent < COLLAPSED_UNIT or cumulative <= 0:
+            return
+        stack = path + (get_function_label(function),)
+        stacks[stack] += time_spent * own / cumulative
+        for callee, callee_cumulative in callees[function].items():
+            # Recursive calls are already counted in the outermost call
+            if get_function_label(callee) not in stack:
+                descend(
+                    callee, stack, time_spent * callee_cumulative / cumulative
+                )
+
+    for function, (_, _, _, cumulative, callers) in entries.items():
+        if not callers:
+            descend(function, (), cumulative)
+
+    return Counter(
+        {
+            stack: round(time_spent / COLLAPSED_UNIT)
+            for stack, time_spent in stacks.items()
+            if round(time_spent / COLLAPSED_UNIT) > 0
+        }
+    )
+
+
+def write_collapsed_stacks(path: str, stage: str, stacks: Counter) -> None:
+    """Write stacks in the collapsed format used by flame graph tools.
+
+    Each line is a stack of semicolon-separated frames, rooted at
+    the name of the stage, followed by its weight.
+    :param path: str, path to write to
+    :param stage: str, name of the stage
+    :param stacks: Counter of stacks, as from get_collapsed_stacks
+    :return: None
+    """
+    with open(path, "w") as outfile:
+        for stack, count in stacks.most_common():
+            frames = ";".join((stage,) + stack).replace("\n", " ")
+            outfile.write(f"{frames} {count}\n")
+
+
+@contextmanager
+def profile_stage(profile_dir: Optional[str], stage: str) -> Iterator[None]:
+    """Profile a stage of the pipeline, if profiling is enabled.
+
+    Writes a cProfile file (<stage>.prof, readable with pstats or
+    snakeviz) and stacks derived from it, weighted in microseconds
+    (<stage>.collapsed, readable with flamegraph.pl or speedscope),
+    to the profile directory.
+    :param profile_dir: str, directory to write profiles to,
+    or None to run the stage without profiling
+    :param stage: str, name of the stage
+    :return: None
+    """
+    if not profile_dir:
+        yield
+        return
+
+    os.makedirs(profile_dir, exist_ok=True)
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        profiler.dump_stats(
+            os.path.join(profile_dir, f"{stage}{PROFILE_SUFFIX}")
+        )
+        write_collapsed_stacks(
+            os.path.join(profile_dir, f"{stage}{COLLAPSED_SUFFIX}"),
+            stage,
+            get_collapsed_stacks(pstats.Stats(profiler)),
+        )
+        print(f"Profiled {stage}: {elapsed:.3f}s.")
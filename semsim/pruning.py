@@ -0,0 +1,196 @@
+"""Generate candidate pairs that may meet a Resnik cutoff."""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from grape import Graph
+from grape.similarities import DAGResnik
+
+from .ancestors import get_ancestor_closure
+from .measures import compute_measures
+
+
+def get_information_contents(resnik_model: DAGResnik) -> np.ndarray:
+    """Retrieve the information content of each node.
+
+    Parameters
+    -------------------
+    resnik_model: DAGResnik
+        A Resnik model, already fit.
+    return: np.ndarray
+        The information content of each node, by node ID.
+    """
+    # The grape wrapper does not expose these, but the underlying
+    # model computes them during fitting. This reaches into the
+    # private `_model` attribute, as of grape 0.2.5 (ensmallen 0.8.100).
+    return resnik_model._model.get_information_contents()
+
+
+def get_candidate_groups(
+    dag: Graph,
+    information_contents: np.ndarray,
+    cutoff: float,
+    node_ids: np.ndarray,
+    ancestor_closure: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> Dict[int, np.ndarray]:
+    """Group nodes under the shared ancestors they could score on.
+
+    The Resnik similarity of two nodes is the information content
+    of their most informative common ancestor, so it can never
+    exceed the information content of either node. Nodes below
+    the cutoff are therefore dropped, and any pair at or above
+    the cutoff must share an ancestor with information content
+    at or above the cutoff. It is enough to consider the topmost
+    of these ancestors, i.e. those without such a parent.
+
+    Parameters
+    -------------------
+    dag: Graph
+        The DAG the Resnik model was fit on.
+    information_contents: np.ndarray
+        The information content of each node, by node ID.
+    cutoff: float
+        Pairs with Resnik similarity below this value will not be retained.
+    node_ids: np.ndarray
+        IDs of the nodes to be compared for similarity.
+    ancestor_closure: Tuple[np.ndarray, np.ndarray]
+        The ancestor closure of the DAG, as from `get_ancestor_closure`.
+        If not provided, it will be computed.
+    return: Dict[int, np.ndarray]
+        Node IDs of the candidate nodes, keyed by the ID of
+        the shared ancestor they descend from.
+    """
+    number_of_nodes = dag.get_number_of_nodes()
+    edges = dag.get_directed_edge_node_ids()
+
+    is_informative = information_contents >= cutoff
+    has_informative_parent = np.zeros(number_of_nodes, dtype=bool)
+    has_informative_parent[edges[is_informative[edges[:, 0]], 1]] = True
+    is_frontier = is_informative & ~has_informative_parent
+
+    is_candidate = np.zeros(number_of_nodes, dtype=bool)
+    is_candidate[node_ids] = True
+    is_candidate &= is_informative
+
+    if ancestor_closure is None:
+        ancestor_closure = get_ancestor_closure(dag)
+    indptr, indices = ancestor_closure
+    descendants = np.repeat(
+        np.arange(number_of_nodes, dtype=np.uint32), np.diff(indptr)
+    )
+    keep = is_candidate[descendants] & is_frontier[indices]
+    descendants = descendants[keep]
+    ancestors = indices[keep]
+
+    order = np.argsort(ancestors, kind="stable")
+    ancestors = ancestors[order]
+    descendants = descendants[order]
+    group_ids, starts = np.unique(ancestors, return_index=True)
+
+    return {
+        int(group_id): group
+        for group_id, group in zip(
+            group_ids, np.split(descendants, starts[1:])
+        )
+        if len(group) > 1
+    }
+
+
+def get_pruned_resnik_similarities(
+    dag: Graph,
+    resnik_model: DAGResnik,
+    prefixes: List[str],
+    cutoff: float,
+    ancestor_closure: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+) -> pd.DataFrame:
+    """Compute Resnik similarities only for pairs that may meet the cutoff.
+
+    This produces every pair of nodes with one of the prefixes whose
+    Resnik similarity meets the cutoff, without enumerating the whole
+    clique. Pairs are scored with the information content of their
+    most informative common ancestor, from the ancestor closure.
+    This may produce more rows than
+    `DAGResnik.get_similarities_from_clique_graph_node_prefixes`
+    with `minimum_similarity` set to the cutoff, as that scores the
+    first common ancestor it finds, which on graphs with multiple
+    roots is not always the most informative (as of grape 0.2.5).
+
+    Parameters
+    -------------------
+    dag: Graph
+        The DAG the Resnik model was fit on.
+    resnik_model: DAGResnik
+        A Resnik model, already fit.
+    prefixes: List[str]
+        Nodes with one of these prefixes will be compared for similarity.
+    cutoff: float
+        Pairs with Resnik similarity below this value will not be retained.
+        Must be greater than zero.
+    ancestor_closure: Tuple[np.ndarray, np.ndarray]
+        The ancestor closure of the DAG, as from `get_ancestor_closure`.
+        If not provided, it will be computed.
+    return: pd.DataFrame
+        Columns source, destination (node IDs, source < destination)
+        and resnik_score.
+    """
+    if cutoff <= 0:
+        raise ValueError("Pruning requires a cutoff greater than zero.")
+
+    node_ids = np.array(
+        [
+            node_id
+            for node_id, name in enumerate(dag.get_node_names())
+            if name.startswith(tuple(prefixes))
+        ],
+        dtype=np.uint32,
+    )
+    information_contents = get_information_contents(resnik_model)
+    if ancestor_closure is None:
+        ancestor_closure = get_ancestor_closure(dag)
+
+    groups = get_candidate_groups(
+        dag=dag,
+        information_contents=information_contents,
+        cutoff=cutoff,
+        node_ids=node_ids,
+        ancestor_closure=ancestor_closure,
+    )
+    print(
+        f"Pruned to {sum(len(group) for group in groups.values())} "
+        f"candidate nodes in {len(groups)} groups."
+    )
+
+    # Groups are sorted by node ID, so each source precedes its destination
+    all_pairs = [np.empty((0, 2), dtype=np.uint32)]
+    for group in groups.values():
+        sources, destinations = np.triu_indices(len(group), k=1)
+        all_pairs.append(
+            np.stack([group[sources], group[destinations]], axis=1)
+        )
+    pairs = np.concatenate(all_pairs)
+
+    # Nodes under more than one shared ancestor appear in several groups
+    keys = (
+        pairs[:, 0].astype(np.int64) * dag.get_number_of_nodes()
+        + pairs[:, 1]
+    )
+    _, unique_index = np.unique(keys, return_index=True)
+    pairs = pairs[unique_index]
+
+    scores = compute_measures(
+        ancestor_closure,
+        information_contents,
+        pairs[:, 0],
+        pairs[:, 1],
+        ["resnik"],
+    )["resnik"]
+    keep = scores >= cutoff
+
+    return pd.DataFrame(
+        {
+            "source": pairs[keep, 0],
+            "destination": pairs[keep, 1],
+            "resnik_score": scores[keep].astype(np.float32),
+        }
+    )
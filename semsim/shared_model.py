@@ -0,0 +1,398 @@
+"""Store a fitted model on disk for scoring by many processes at once.
+
+The model is saved as plain numpy arrays and loaded memory-mapped and
+read-only, so every process attached to it shares the same pages
+rather than holding its own copy of the graph and Resnik model.
+"""
+
+import os
+from itertools import combinations
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .measures import get_pair_ancestor_keys
+
+SHARED_MODEL_ARRAYS = [
+    "ancestors_indptr",
+    "ancestors_indices",
+    "information_contents",
+    "names",
+    "name_order",
+    "root_ids",
+    "root_distances",
+    "root_predecessors",
+]
+
+
+def save_shared_model(
+    dag, resnik_model, path: str, ancestor_closure=None
+) -> str:
+    """Write the arrays needed to score pairs of nodes.
+
+    Parameters
+    -------------------
+    dag: Graph
+        The DAG the Resnik model was fit on.
+    resnik_model: DAGResnik
+        A Resnik model, already fit.
+    path: str
+        Directory to write the model to.
+    ancestor_closure: Tuple[np.ndarray, np.ndarray]
+        The ancestor closure of the DAG, as from `get_ancestor_closure`.
+        If not provided, it will be computed.
+    return: str
+        The directory the model was written to.
+    """
+    # Imported here so that processes which only attach to
+    # a model need not import grape.
+    from .ancestors import get_ancestor_closure
+    from .pruning import get_information_contents
+
+    os.makedirs(path, exist_ok=True)
+
+    if ancestor_closure is None:
+        ancestor_closure = get_ancestor_closure(dag)
+    indptr, indices = ancestor_closure
+    names = np.array([name.encode() for name in dag.get_node_names()])
+    root_ids = np.array(dag.get_root_node_ids(), dtype=np.uint32)
+    searches = [
+        dag.get_breadth_first_search_from_node_ids(
+            src_node_id=root,
+            compute_predecessors=True,
+        )
+        for root in root_ids
+    ]
+
+    arrays = {
+        "ancestors_indptr": indptr,
+        "ancestors_indices": indices,
+        "information_contents": get_information_contents(resnik_model),
+        "names": names,
+        "name_order": np.argsort(names),
+        "root_ids": root_ids,
+        "root_distances": np.array([bfs.get_distances() for bfs in searches]),
+        "root_predecessors": np.array(
+            [bfs.get_predecessors() for bfs in searches]
+        ),
+    }
+    for key in SHARED_MODEL_ARRAYS:
+        np.save(os.path.join(path, f"{key}.npy"), arrays[key])
+
+    return path
+
+
+def load_shared_model(path: str) -> Dict[str, np.ndarray]:
+    """Attach to a model written by save_shared_model.
+
+    Parameters
+    -------------------
+    path: str
+        Directory the model was written to.
+    return: Dict[str, np.ndarray]
+        Read-only, memory-mapped arrays, by name.
+    """
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Cannot find shared model: {path}")
+    return {
+        key: np.load(os.path.join(path, f"{key}.npy"), mmap_mode="r")
+        for key in SHARED_MODEL_ARRAYS
+    }
+
+
+def get_node_ids_from_shared_model(
+    model: Dict[str, np.ndarray], node_names: List[str]
+) -> np.ndarray:
+    """Look up node IDs by name.
+
+    Parameters
+    -------------------
+    model: Dict[str, np.ndarray]
+        A model, as from load_shared_model.
+    node_names: List[str]
+        Names of the nodes to look up.
+    return: np.ndarray
+        IDs of the nodes.
+    """
+    encoded = np.array([name.encode() for name in node_names])
+    positions = np.searchsorted(
+        model["names"], encoded, sorter=model["name_order"]
+    )
+    positions = np.minimum(positions, len(model["names"]) - 1)
+    node_ids = model["name_order"][positions]
+    unknown = model["names"][node_ids] != encoded
+    if unknown.any():
+        raise ValueError(
+            "Unknown node names: "
+            f"{', '.join(np.array(node_names)[unknown])}"
+        )
+    return node_ids
+
+
+def get_shared_resnik_similarities(
+    model: Dict[str, np.ndarray],
+    sources: np.ndarray,
+    destinations: np.ndarray,
+) -> np.ndarray:
+    """Compute Resnik similarities for pairs of nodes.
+
+    Each pair's ancestors are expanded into (pair, ancestor) keys,
+    so the shared ancestors of all pairs are found with a single
+    intersection rather than one per pair. This matches grape's
+    Resnik model on graphs with a single root; with multiple roots,
+    ancestors under every root are considered, as in
+    `compute_subset_sims`.
+
+    Parameters
+    -------------------
+    model: Dict[str, np.ndarray]
+        A model, as from load_shared_model.
+    sources: np.ndarray
+        Node IDs of the first node in each pair.
+    destinations: np.ndarray
+        Node IDs of the second node in each pair.
+    return: np.ndarray
+        Information content of the most informative common ancestor
+        of each pair.
+    """
+    indptr = model["ancestors_indptr"]
+    indices = model["ancestors_indices"]
+    number_of_nodes = len(indptr) - 1
+
+    shared = np.intersect1d(
+        get_pair_ancestor_keys(indptr, indices, sources),
+        get_pair_ancestor_keys(indptr, indices, destinations),
+        assume_unique=True,
+    )
+    similarities = np.zeros(len(sources), dtype=np.float32)
+    np.maximum.at(
+        similarities,
+        shared // number_of_nodes,
+        model["information_contents"][shared % number_of_nodes],
+    )
+    return similarities
+
+
+def get_shared_jaccard_similarities(
+    model: Dict[str, np.ndarray],
+    sources: np.ndarray,
+    destinations: np.ndarray,
+) -> np.ndarray:
+    """Compute ancestor Jaccard similarities for pairs of nodes.
+
+    As in `Graph.get_ancestors_jaccard_from_node_ids`, ancestors are
+    taken along the breadth-first search tree from the root, so they
+    form a path: the shared ancestors of two nodes are those of their
+    lowest common ancestor in the tree. With multiple roots, the
+    maximum over roots is returned, as in `compute_pairwise_sims`
+    and `compute_subset_sims`.
+
+    Parameters
+    -------------------
+    model: Dict[str, np.ndarray]
+        A model, as from load_shared_model.
+    sources: np.ndarray
+        Node IDs of the first node in each pair.
+    destinations: np.ndarray
+        Node IDs of the second node in each pair.
+    return: np.ndarray
+        Jaccard similarity of each pair.
+    """
+    similarities = np.zeros(len(sources), dtype=np.float32)
+    for distances, predecessors in zip(
+        model["root_distances"], model["root_predecessors"]
+    ):
+        unreachable = np.iinfo(distances.dtype).max
+        first = np.array(sources, dtype=np.int64)
+        second = np.array(destinations, dtype=np.int64)
+        reachable = (distances[first] != unreachable) & (
+            distances[second] != unreachable
+        )
+        first, second = first[reachable], second[reachable]
+        first_depths = distances[first].astype(np.int64)
+        second_depths = distances[second].astype(np.int64)
+        lca, other = first.copy(), second.copy()
+        lca_depths, other_depths = first_depths.copy(), second_depths.copy()
+
+        # Lift the deeper node of each pair until both are level,
+        # then lift both until they meet.
+        while (deeper := lca_depths > other_depths).any():
+            lca[deeper] = predecessors[lca[deeper]]
+            lca_depths[deeper] -= 1
+        while (deeper := other_depths > lca_depths).any():
+            other[deeper] = predecessors[other[deeper]]
+            other_depths[deeper] -= 1
+        while (apart := lca != other).any():
+            lca[apart] = predecessors[lca[apart]]
+            other[apart] = predecessors[other[apart]]
+            lca_depths[apart] -= 1
+
+        intersection = lca_depths + 1
+        union = first_depths + second_depths + 2 - intersection
+        similarities[reachable] = np.maximum(
+            similarities[reachable], intersection / union
+        )
+    return similarities
+
+
+def extract_query_subgraph(
+    model: Dict[str, np.ndarray], node_ids: np.ndarray
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Extract the part of a model needed to score some nodes.
+
+    Only the nodes and their ancestors are kept. Their information
+    contents come from the full model, so they are normalized over
+    the whole graph, and every node on a shortest path from a root
+    to a node is one of its ancestors, so breadth-first search trees
+    are kept intact. Scores from the extracted model therefore match
+    those from the full model, while only the pages of the full
+    model holding these ancestors are read.
+
+    Parameters
+    -------------------
+    model: Dict[str, np.ndarray]
+        A model, as from load_shared_model.
+    node_ids: np.ndarray
+        IDs of the nodes to be scored.
+    return: Tuple[Dict[str, np.ndarray], np.ndarray]
+        The extracted model, and the IDs of the nodes within it.
+    """
+    indptr = model["ancestors_indptr"]
+    indices = model["ancestors_indices"]
+    node_ids = np.asarray(node_ids, dtype=np.int64)
+
+    def get_ancestors(node_id: int) -> np.ndarray:
+        return np.asarray(indices[indptr[node_id]:indptr[node_id + 1]])
+
+    subgraph_nodes = np.unique(
+        np.concatenate([get_ancestors(node_id) for node_id in node_ids])
+    ).astype(np.int64)
+    closure = [get_ancestors(node_id) for node_id in subgraph_nodes]
+    sub_indptr = np.zeros(len(subgraph_nodes) + 1, dtype=np.int64)
+    np.cumsum([len(ancestors) for ancestors in closure], out=sub_indptr[1:])
+    sub_indices = np.searchsorted(
+        subgraph_nodes, np.concatenate(closure)
+    ).astype(np.uint32)
+
+    root_rows = np.flatnonzero(np.isin(model["root_ids"], subgraph_nodes))
+    root_distances = np.asarray(
+        model["root_distances"][np.ix_(root_rows, subgraph_nodes)]
+    )
+    predecessors = np.asarray(
+        model["root_predecessors"][np.ix_(root_rows, subgraph_nodes)]
+    ).astype(np.int64)
+    # Predecessors outside the subgraph are left out of range,
+    # for validate_query_subgraph to find.
+    positions = np.minimum(
+        np.searchsorted(subgraph_nodes, predecessors),
+        len(subgraph_nodes) - 1,
+    )
+    root_predecessors = np.where(
+        subgraph_nodes[positions] == predecessors,
+        positions,
+        len(subgraph_nodes),
+    )
+
+    names = np.asarray(model["names"][subgraph_nodes])
+    subgraph: Dict[str, np.ndarray] = {
+        "ancestors_indptr": sub_indptr,
+        "ancestors_indices": sub_indices,
+        "information_contents": np.asarray(
+            model["information_contents"][subgraph_nodes]
+        ),
+        "names": names,
+        "name_order": np.argsort(names),
+        "root_ids": np.searchsorted(
+            subgraph_nodes, model["root_ids"][root_rows]
+        ).astype(np.uint32),
+        "root_distances": root_distances,
+        "root_predecessors": root_predecessors,
+    }
+    return subgraph, np.searchsorted(subgraph_nodes, node_ids)
+
+
+def validate_query_subgraph(subgraph: Dict[str, np.ndarray]) -> None:
+    """Check that an extracted model is closed over its ancestors.
+
+    Raises a ValueError if a node is not its own ancestor, or if the
+    path from a root to a reachable node leaves the subgraph or does
+    not descend one level at a time, as happens if the model was
+    written from a graph that is not a DAG or has since been changed.
+
+    Parameters
+    -------------------
+    subgraph: Dict[str, np.ndarray]
+        A model, as from extract_query_subgraph.
+    return: None
+    """
+    indptr = subgraph["ancestors_indptr"]
+    indices = subgraph["ancestors_indices"]
+    number_of_nodes = len(indptr) - 1
+    rows = np.repeat(np.arange(number_of_nodes), np.diff(indptr))
+    if not (
+        np.bincount(rows[indices == rows], minlength=number_of_nodes) == 1
+    ).all():
+        raise ValueError(
+            "Shared model is inconsistent:"
+            " a node is not among its own ancestors."
+        )
+
+    for root, distances, predecessors in zip(
+        subgraph["root_ids"],
+        subgraph["root_distances"],
+        subgraph["root_predecessors"],
+    ):
+        reachable = distances != np.iinfo(distances.dtype).max
+        reachable[root] = False
+        parents = predecessors[reachable]
+        if (parents >= number_of_nodes).any() or (
+            distances[parents].astype(np.int64)
+            != distances[reachable].astype(np.int64) - 1
+        ).any():
+            raise ValueError(
+                "Shared model is inconsistent: a path from a root"
+                " leaves the ancestors of a node."
+            )
+
+
+def compute_shared_subset_sims(
+    model_path: str, nodes: List[str]
+) -> Dict[Tuple[str, str], Tuple[float, float]]:
+    """Compute Resnik and Jaccard similarities from a shared model.
+
+    This is suitable for use in worker processes, as attaching
+    to the model does not copy it, and only the subgraph of the
+    nodes' ancestors is extracted from it for scoring.
+
+    Parameters
+    -------------------
+    model_path: str
+        Directory a model was written to by save_shared_model.
+    nodes: list
+        Nodes to be compared for similarity.
+    return: dict of tuples, with the IDs of each pair (a tuple) as
+    the key and a tuple of (Resnik, Jaccard) as value.
+    """
+    model = load_shared_model(model_path)
+    all_pairs = list(combinations(nodes, 2))
+    if not all_pairs:
+        return {}
+
+    subgraph, subgraph_ids = extract_query_subgraph(
+        model, get_node_ids_from_shared_model(model, nodes)
+    )
+    validate_query_subgraph(subgraph)
+
+    node_ids = dict(zip(nodes, subgraph_ids))
+    sources = np.array([node_ids[pair[0]] for pair in all_pairs])
+    destinations = np.array([node_ids[pair[1]] for pair in all_pairs])
+
+    resnik = get_shared_resnik_similarities(subgraph, sources, destinations)
+    jaccard = get_shared_jaccard_similarities(
+        subgraph, sources, destinations
+    )
+
+    return {
+        pair: (float(rs_val), float(js_val))
+        for pair, rs_val, js_val in zip(all_pairs, resnik, jaccard)
+    }
@@ -1,40 +1,52 @@
 """Provide utilities for graph loading."""
 
 import os
+import shutil
 import tarfile
+from typing import Dict
 
 from grape import Graph
 
 
-def load_local_graph(name: str, infile: str) -> Graph:
-    """Decompress and load a graph file.
+def extract_graph_files(infile: str, outdir: str) -> Dict[str, str]:
+    """Decompress the node and edge lists of a graph file.
 
-    :name: str, name of graph
     :infile: str, path to tar.gz graph file
-    :return: Graph
+    :outdir: str, directory to write the node and edge lists to
+    :return: dict with the paths of the "Nodes" and "Edges" lists
     """
-    # Decompress and look for node/edgelists
     infile_contents = {"Nodes": "", "Edges": ""}
-    decomp_infile = tarfile.open(infile)
-    outdir = os.path.dirname(infile)
-    for filename in decomp_infile.getnames():
-        if filename.endswith("_nodes.tsv"):
-            infile_contents["Nodes"] = os.path.join(outdir, filename)
-            decomp_infile.extract(
-                member=filename, path=outdir
-            )
-        if filename.endswith("_edges.tsv"):
-            infile_contents["Edges"] = os.path.join(outdir, filename)
-            decomp_infile.extract(
-                member=filename, path=outdir
+    with tarfile.open(infile) as decomp_infile:
+        for member in decomp_infile.getmembers():
+            if member.name.endswith("_nodes.tsv"):
+                key = "Nodes"
+            elif member.name.endswith("_edges.tsv"):
+                key = "Edges"
+            else:
+                continue
+            infile_contents[key] = os.path.join(
+                outdir, os.path.basename(member.name)
             )
+            extracted = decomp_infile.extractfile(member)
+            if extracted is None:
+                raise ValueError(f"Cannot extract {member.name}.")
+            with extracted, open(infile_contents[key], "wb") as outfile:
+                shutil.copyfileobj(extracted, outfile)
 
-    decomp_infile.close()
+    return infile_contents
 
-    # Load that graph!
-    outgraph = Graph.from_csv(
-        node_path=infile_contents["Nodes"],
-        edge_path=infile_contents["Edges"],
+
+def load_graph_files(name: str, nodes_path: str, edges_path: str) -> Graph:
+    """Load a graph from KGX TSV node and edge lists.
+
+    :name: str, name of graph
+    :nodes_path: str, path to node list
+    :edges_path: str, path to edge list
+    :return: Graph
+    """
+    return Graph.from_csv(
+        node_path=nodes_path,
+        edge_path=edges_path,
         node_list_separator="\t",
         edge_list_separator="\t",
         node_list_header=True,
@@ -49,4 +61,18 @@ def load_local_graph(name: str, infile: str) -> Graph:
         verbose=True,
     )
 
-    return outgraph
+
+def load_local_graph(name: str, infile: str) -> Graph:
+    """Decompress and load a graph file.
+
+    :name: str, name of graph
+    :infile: str, path to tar.gz graph file
+    :return: Graph
+    """
+    # Decompress and look for node/edgelists
+    infile_contents = extract_graph_files(infile, os.path.dirname(infile))
+
+    # Load that graph!
+    return load_graph_files(
+        name, infile_contents["Nodes"], infile_contents["Edges"]
+    )
@@ -0,0 +1,315 @@
+"""Validate, and optionally repair, a DAG in a single pass."""
+
+import fcntl
+import json
+import os
+import tempfile
+import warnings
+from typing import Optional
+
+import numpy as np
+from grape import Graph
+
+
+def get_component_labels(
+    number_of_nodes: int, edges: np.ndarray
+) -> np.ndarray:
+    """Label the weakly connected components of a graph.
+
+    Parameters
+    -------------------
+    number_of_nodes: int
+        Number of nodes in the graph.
+    edges: np.ndarray
+        Array of shape (number of edges, 2) of source and destination IDs.
+    return: np.ndarray
+        For each node, the smallest node ID in its component.
+    """
+    labels = np.arange(number_of_nodes, dtype=np.int64)
+    while True:
+        source_labels = labels[edges[:, 0]]
+        destination_labels = labels[edges[:, 1]]
+        lowest_labels = np.minimum(source_labels, destination_labels)
+        hooked = labels.copy()
+        np.minimum.at(hooked, source_labels, lowest_labels)
+        np.minimum.at(hooked, destination_labels, lowest_labels)
+        # Point every node directly at the root of its tree
+        while True:
+            jumped = hooked[hooked]
+            if np.array_equal(jumped, hooked):
+                break
+            hooked = jumped
+        if np.array_equal(hooked, labels):
+            return labels
+        labels = hooked
+
+
+def get_cyclic_node_mask(
+    number_of_nodes: int, edges: np.ndarray
+) -> np.ndarray:
+    """Find the nodes lying on or below a cycle.
+
+    Nodes without remaining incoming edges are peeled off level by
+    level; whatever remains lies on or below a cycle, so the graph
+    is acyclic if nothing remains. Self-loops are not included.
+
+    Parameters
+    -------------------
+    number_of_nodes: int
+        Number of nodes in the graph.
+    edges: np.ndarray
+        Array of shape (number of edges, 2) of source and destination IDs,
+        sorted by source, as from `Graph.get_directed_edge_node_ids`.
+    return: np.ndarray
+        For each node, whether it remains after peeling.
+    """
+    is_selfloop = edges[:, 0] == edges[:, 1]
+    indptr = np.searchsorted(
+        edges[:, 0], np.arange(number_of_nodes + 1, dtype=edges.dtype)
+    )
+
+    in_degrees = np.bincount(
+        edges[~is_selfloop, 1], minlength=number_of_nodes
+    )
+    frontier = np.flatnonzero(in_degrees == 0)
+    while len(frontier) > 0:
+        counts = indptr[frontier + 1] - indptr[frontier]
+        out_edge_ids = np.arange(counts.sum()) + np.repeat(
+            indptr[frontier] - np.cumsum(counts) + counts, counts
+        )
+        out_edge_ids = out_edge_ids[~is_selfloop[out_edge_ids]]
+        destinations = edges[out_edge_ids, 1]
+        np.subtract.at(in_degrees, destinations, 1)
+        in_degrees[frontier] = -1
+        frontier = np.unique(destinations[in_degrees[destinations] == 0])
+
+    return in_degrees > 0
+
+
+def get_cycle_edge_ids(
+    number_of_nodes: int,
+    edges: np.ndarray,
+    remaining: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Find edges whose removal makes a graph acyclic.
+
+    A depth-first search over only the nodes left by peeling
+    (see `get_cyclic_node_mask`) finds the back edges.
+    Self-loops are not included.
+
+    Parameters
+    -------------------
+    number_of_nodes: int
+        Number of nodes in the graph.
+    edges: np.ndarray
+        Array of shape (number of edges, 2) of source and destination IDs,
+        sorted by source, as from `Graph.get_directed_edge_node_ids`.
+    remaining: np.ndarray
+        The nodes left by peeling, as from `get_cyclic_node_mask`.
+        If not provided, they will be found.
+    return: np.ndarray
+        IDs of the back edges, i.e. their indices in edges.
+    """
+    if remaining is None:
+        remaining = get_cyclic_node_mask(number_of_nodes, edges)
+    is_selfloop = edges[:, 0] == edges[:, 1]
+    indptr = np.searchsorted(
+        edges[:, 0], np.arange(number_of_nodes + 1, dtype=edges.dtype)
+    )
+
+    cycle_edge_ids = []
+    state = np.zeros(number_of_nodes, dtype=np.int8)  # 1: on stack, 2: done
+    for start in np.flatnonzero(remaining):
+        if state[start]:
+            continue
+        state[start] = 1
+        stack = [(start, indptr[start])]
+        while stack:
+            node, edge_id = stack[-1]
+            if edge_id == indptr[node + 1]:
+                state[node] = 2
+                stack.pop()
+                continue
+            stack[-1] = (node, edge_id + 1)
+            child = edges[edge_id, 1]
+            if is_selfloop[edge_id] or not remaining[child]:
+                continue
+            if state[child] == 1:
+                cycle_edge_ids.append(edge_id)
+            elif state[child] == 0:
+                state[child] = 1
+                stack.append((child, indptr[child]))
+
+    return np.array(cycle_edge_ids, dtype=np.int64)
+
+
+def get_dag_diagnostics(dag: Graph, find_cycle_edges: bool = False) -> dict:
+    """Check connectivity, acyclicity and self-loops in one pass.
+
+    Parameters
+    -------------------
+    dag: Graph
+        The graph to check.
+    find_cycle_edges: bool
+        If True, also find the edges closing cycles, e.g. to repair
+        the graph. This searches the cycles depth-first in Python,
+        so is much slower than finding whether there are any.
+    return: dict
+        With the number of components, the size of the largest one,
+        the IDs of self-loop edges, whether there are cycles,
+        the IDs of nodes outside the largest component and,
+        if requested, the IDs of edges closing cycles.
+    """
+    number_of_nodes = dag.get_number_of_nodes()
+    edges = dag.get_directed_edge_node_ids()
+
+    labels = get_component_labels(number_of_nodes, edges)
+    label_sizes = np.bincount(labels, minlength=1)
+    component_sizes = label_sizes[label_sizes > 0]
+    remaining = get_cyclic_node_mask(number_of_nodes, edges)
+
+    diagnostics = {
+        "number_of_components": int(len(component_sizes)),
+        "largest_component_size": int(component_sizes.max(initial=0)),
+        "selfloop_edge_ids": np.flatnonzero(
+            edges[:, 0] == edges[:, 1]
+        ).tolist(),
+        "has_cycles": bool(remaining.any()),
+        "disconnected_node_ids": np.flatnonzero(
+            labels != label_sizes.argmax()
+        ).tolist(),
+    }
+    if find_cycle_edges:
+        diagnostics["cycle_edge_ids"] = get_cycle_edge_ids(
+            number_of_nodes, edges, remaining
+        ).tolist()
+
+    return diagnostics
+
+
+def load_diagnostics_cache(cache_path: str) -> dict:
+    """Load cached graph diagnostics.
+
+    Parameters
+    -------------------
+    cache_path: str
+        Path to a JSON file of diagnostics, keyed by graph hash.
+    return: dict
+        Diagnostics by graph hash, empty if there is no cache yet.
+    """
+    if not os.path.exists(cache_path):
+        return {}
+    with open(cache_path, "r") as cache_file:
+        return json.load(cache_file)
+
+
+def save_diagnostics(
+    cache_path: str, dag_hash: str, diagnostics: dict
+) -> None:
+    """Add the diagnostics of a graph to a cache.
+
+    Processes validating graphs at once take turns under a lock,
+    so no entry is lost, and each writes a new file in place of
+    the old, so none reads a partly written cache.
+
+    Parameters
+    -------------------
+    cache_path: str
+        Path to a JSON file of diagnostics, keyed by graph hash.
+    dag_hash: str
+        Hash of the graph.
+    diagnostics: dict
+        Diagnostics of the graph, as from get_dag_diagnostics.
+    return: None
+    """
+    with open(f"{cache_path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        cache = load_diagnostics_cache(cache_path)
+        cache[dag_hash] = diagnostics
+        temp_fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(cache_path)),
+            prefix=".validation-",
+        )
+        try:
+            with os.fdopen(temp_fd, "w") as cache_file:
+                json.dump(cache, cache_file)
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+def validate_dag(
+    dag: Graph, repair: bool = False, cache_path: Optional[str] = None
+) -> Graph:
+    """Validate a DAG, keeping only its largest component.
+
+    Parameters
+    -------------------
+    dag: Graph
+        The graph to validate.
+    repair: bool
+        If True, drop self-loops and edges closing cycles.
+        Otherwise, self-loops raise an error and cycles a warning.
+    cache_path: str
+        Path to a JSON file of diagnostics for previously validated
+        graphs, keyed by graph hash. If the graph has been seen before,
+        the checks are skipped, and the nodes outside its largest
+        component are taken from the cache.
+    return: Graph
+        The validated graph.
+    """
+    cache = load_diagnostics_cache(cache_path) if cache_path else {}
+
+    dag_hash = str(dag.hash())
+    diagnostics = cache.get(dag_hash, {})
+    # Entries without has_cycles predate it, and edges closing
+    # cycles are only found when they are needed for repair.
+    if "has_cycles" in diagnostics and not (
+        repair
+        and diagnostics["has_cycles"]
+        and "cycle_edge_ids" not in diagnostics
+    ):
+        print("Using cached graph diagnostics.")
+    else:
+        diagnostics = get_dag_diagnostics(dag, find_cycle_edges=repair)
+        if cache_path:
+            save_diagnostics(cache_path, dag_hash, diagnostics)
+
+    node_ids_to_remove = []
+    edge_ids_to_remove = []
+
+    if diagnostics["number_of_components"] > 1:
+        warnings.warn(
+            "Graph contains multiple disconnected components."
+            " Will ignore all but the largest component."
+            f" {diagnostics['number_of_components']} components are present."
+            f" Largest component has {diagnostics['largest_component_size']}"
+            " nodes."
+        )
+        node_ids_to_remove = diagnostics["disconnected_node_ids"]
+
+    if diagnostics["selfloop_edge_ids"] or diagnostics["has_cycles"]:
+        warnings.warn("Graph is not directed acyclic.")
+        if repair:
+            edge_ids_to_remove = (
+                diagnostics["selfloop_edge_ids"]
+                + diagnostics["cycle_edge_ids"]
+            )
+            warnings.warn(
+                f"Removing {len(diagnostics['selfloop_edge_ids'])} self loops"
+                f" and {len(diagnostics['cycle_edge_ids'])} edges in cycles."
+            )
+        elif diagnostics["selfloop_edge_ids"]:
+            raise ValueError(
+                "Self loops are present."
+                " Cannot complete similarity measurement."
+            )
+
+    if not node_ids_to_remove and not edge_ids_to_remove:
+        return dag
+
+    return dag.filter_from_ids(
+        node_ids_to_remove=node_ids_to_remove,
+        edge_ids_to_remove=edge_ids_to_remove,
+    )
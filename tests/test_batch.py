@@ -0,0 +1,126 @@
+"""Test running batches of similarity jobs."""
+
+import json
+import os
+import tarfile
+import tempfile
+from unittest import TestCase, mock
+
+from semsim.batch import group_jobs, load_graph, load_jobs, run_batch
+from semsim.precision import read_similarities
+
+
+class TestBatch(TestCase):
+    """Test running many jobs on one loaded graph."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.input_file = os.path.join(self.tempdir.name, "test_kgx.tar.gz")
+        with tarfile.open(self.input_file, "w:gz") as archive:
+            for suffix in ["nodes", "edges"]:
+                archive.add(
+                    f"tests/resources/test_dag_{suffix}.tsv",
+                    arcname=f"test_kgx_{suffix}.tsv",
+                )
+        self.jobs_file = os.path.join(self.tempdir.name, "jobs.json")
+        with open(self.jobs_file, "w") as jobs_file:
+            json.dump(
+                [
+                    {"name": "all", "prefixes": ["HP"], "cutoff": 0.0},
+                    {
+                        "name": "pruned",
+                        "prefixes": ["HP"],
+                        "cutoff": 1.0,
+                        "prune": True,
+                    },
+                    {"prefixes": ["HP", "UPHENO"], "cutoff": 0.0},
+                ],
+                jobs_file,
+            )
+        self.output_dir = os.path.join(self.tempdir.name, "output")
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.tempdir.cleanup()
+
+    def test_load_and_group_jobs(self) -> None:
+        """Test that jobs on the same filtered graph are grouped."""
+        jobs = load_jobs(self.jobs_file)
+        self.assertEqual(jobs[2]["name"], "2_HP_UPHENO")
+        self.assertEqual(jobs[0]["predicate"], "biolink:subclass_of")
+        groups = group_jobs(jobs)
+        self.assertEqual(len(groups), 2)
+        self.assertEqual(
+            [job["name"] for job in groups[(("HP",), jobs[0]["predicate"])]],
+            ["all", "pruned"],
+        )
+
+    def test_unknown_measure(self) -> None:
+        """Test that a job with an unknown measure is rejected."""
+        with open(self.jobs_file, "w") as jobs_file:
+            json.dump(
+                [{"prefixes": ["HP"], "measures": ["lin", "unknown"]}],
+                jobs_file,
+            )
+        with self.assertRaises(ValueError):
+            load_jobs(self.jobs_file)
+
+    def test_unknown_precision(self) -> None:
+        """Test that a job with an unknown precision is rejected."""
+        with open(self.jobs_file, "w") as jobs_file:
+            json.dump(
+                [{"prefixes": ["HP"], "precision": "float16"}], jobs_file
+            )
+        with self.assertRaises(ValueError):
+            load_jobs(self.jobs_file)
+
+    def test_run_batch(self) -> None:
+        """Test that each job writes its own similarities."""
+        jobs = load_jobs(self.jobs_file)
+        # Workers are given filtered graphs rather than loading the graph
+        with mock.patch(
+            "semsim.batch.load_graph", wraps=load_graph
+        ) as mock_load_graph:
+            self.assertTrue(
+                run_batch(
+                    ontology="TEST",
+                    jobs=jobs,
+                    output_dir=self.output_dir,
+                    input_file=self.input_file,
+                    workers=2,
+                )
+            )
+        self.assertEqual(mock_load_graph.call_count, 1)
+        self.assertEqual(
+            [name for name in os.listdir(self.output_dir) if name[0] == "."],
+            [],
+        )
+        results = {
+            job["name"]: read_similarities(
+                os.path.join(self.output_dir, job["name"], "TEST_similarities")
+            )
+            for job in jobs
+        }
+        all_pairs = results["all"]
+        pruned_pairs = results["pruned"]
+        self.assertGreater(len(all_pairs), len(pruned_pairs))
+        self.assertEqual(
+            len(pruned_pairs), (all_pairs["resnik_score"] >= 1.0).sum()
+        )
+
+        # Running the jobs in this process gives the same similarities
+        serial_dir = os.path.join(self.tempdir.name, "serial")
+        self.assertTrue(
+            run_batch(
+                ontology="TEST",
+                jobs=jobs,
+                output_dir=serial_dir,
+                input_file=self.input_file,
+            )
+        )
+        for job in jobs:
+            serial_pairs = read_similarities(
+                os.path.join(serial_dir, job["name"], "TEST_similarities")
+            )
+            self.assertTrue(serial_pairs.equals(results[job["name"]]))
@@ -0,0 +1,61 @@
+"""Test the command line interface."""
+
+import subprocess
+import sys
+from unittest import TestCase, mock
+
+from click.testing import CliRunner
+
+from semsim.cli import main
+from semsim.datasets import get_graph_repository, load_graph_metadata
+
+
+class TestCLI(TestCase):
+    """Test the CLI and its startup."""
+
+    def test_help(self) -> None:
+        """Test that help is shown for each command."""
+        runner = CliRunner()
+        for command in [[], ["sim"], ["somesim"], ["batch"], ["phenodigm"]]:
+            result = runner.invoke(main, command + ["--help"])
+            self.assertEqual(result.exit_code, 0)
+
+    def test_startup_imports(self) -> None:
+        """Test that the CLI imports neither grape nor pandas at startup."""
+        heavy_modules = ["grape", "pandas", "tqdm"]
+        result = subprocess.run(  # noqa: S603
+            [
+                sys.executable,
+                "-c",
+                "import sys, semsim.cli;"
+                f"print([m for m in {heavy_modules} if m in sys.modules])",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_get_graph_repository(self) -> None:
+        """Test that graphs are resolved to their repository by name."""
+        self.assertEqual(get_graph_repository("HP"), "kgobo")
+        self.assertEqual(get_graph_repository("KGPhenio"), "kghub")
+
+    def test_graph_registry_from_metadata(self) -> None:
+        """Test that every KG-Hub graph in grape's metadata is resolved."""
+        for name in load_graph_metadata("kghub"):
+            self.assertEqual(get_graph_repository(name), "kghub")
+        self.assertIn("HP", load_graph_metadata("kgobo"))
+
+    def test_unknown_measure(self) -> None:
+        """Test that unknown measures are rejected before loading a graph."""
+        runner = CliRunner()
+        with mock.patch(
+            "semsim.process_ontology.get_similarities"
+        ) as get_similarities:
+            result = runner.invoke(
+                main, ["sim", "-m", "lin,unknown", "-i", "missing", "HP"]
+            )
+        self.assertIsInstance(result.exception, ValueError)
+        self.assertIn("unknown", str(result.exception))
+        get_similarities.assert_not_called()
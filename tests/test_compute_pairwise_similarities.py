@@ -1,11 +1,23 @@
 """Test compute_pairwise_similarities."""
 
+import json
 import os
+import tempfile
 from unittest import TestCase
 
+import numpy as np
+import pandas as pd
 from grape import Graph
+from grape.similarities import DAGResnik
 
 from semsim.compute_pairwise_similarities import compute_pairwise_sims
+from semsim.precision import (
+    get_scales_path,
+    quantize_scores,
+    read_similarities,
+    write_scales,
+)
+from semsim.pruning import get_information_contents
 
 
 class TestComputePairwiseSimilarities(TestCase):
@@ -83,3 +95,146 @@ class TestComputePairwiseSimilarities(TestCase):
             root_node="",
         )
         self.assertTrue(os.path.exists(self.resnik_outpath))
+
+    def test_quantized_similarities(self) -> None:
+        """Test that quantized scores are read back close to the originals."""
+        sims_df = pd.DataFrame(
+            {
+                "source": ["HP:0000152", "HP:0000152"],
+                "destination": ["HP:0001197", "HP:0000598"],
+                "resnik_score": [3.1354942, 1.609438],
+                "jaccard": [0.6666667, 0.25],
+            }
+        )
+        original_df = sims_df.copy()
+        scales = quantize_scores(sims_df, ["resnik_score", "jaccard"])
+        self.assertEqual(sims_df["resnik_score"].dtype, np.uint16)
+        with tempfile.TemporaryDirectory() as tempdir:
+            sims_path = os.path.join(tempdir, "quantized_similarities")
+            sims_df.to_csv(sims_path, index=False)
+            write_scales(sims_path, scales)
+
+            read_df = read_similarities(sims_path)
+            for col in ["resnik_score", "jaccard"]:
+                self.assertEqual(read_df[col].dtype, np.float32)
+                np.testing.assert_allclose(
+                    read_df[col], original_df[col], atol=scales[col]
+                )
+
+    def test_compute_pairwise_sims_uint16(self) -> None:
+        """Test writing, reading and replacing uint16 similarities."""
+        dag = Graph.from_csv(
+            directed=True,
+            node_path="tests/resources/test_dag_nodes.tsv",
+            edge_path="tests/resources/test_dag_edges.tsv",
+            nodes_column="id",
+            node_list_node_types_column="category",
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+            name="Dag",
+        ).to_transposed()
+        counts = dict.fromkeys(dag.get_node_names(), 1)
+        with tempfile.TemporaryDirectory() as tempdir:
+            paths = {}
+            for precision in ["float32", "uint16"]:
+                output_dir = os.path.join(tempdir, precision)
+                os.mkdir(output_dir)
+                self.assertTrue(
+                    compute_pairwise_sims(
+                        dag=dag,
+                        counts=counts,
+                        cutoff=0.5,
+                        path=output_dir,
+                        prefixes=["HP"],
+                        root_node="",
+                        precision=precision,
+                    )
+                )
+                paths[precision] = os.path.join(output_dir, "Dag_similarities")
+
+            scales_path = get_scales_path(paths["uint16"])
+            self.assertTrue(os.path.exists(scales_path))
+            self.assertFalse(os.path.exists(get_scales_path(paths["float32"])))
+            with open(scales_path) as scales_file:
+                scales = json.load(scales_file)
+            self.assertEqual(set(scales), {"resnik_score", "jaccard"})
+
+            expected_df = read_similarities(paths["float32"])
+            read_df = read_similarities(paths["uint16"])
+            self.assertGreater(len(read_df), 0)
+            key_columns = ["source", "destination"]
+            expected_df = expected_df.sort_values(key_columns)
+            read_df = read_df.sort_values(key_columns)
+            self.assertEqual(
+                read_df[key_columns].values.tolist(),
+                expected_df[key_columns].values.tolist(),
+            )
+            for col, scale in scales.items():
+                self.assertEqual(read_df[col].dtype, np.float32)
+                np.testing.assert_allclose(
+                    read_df[col], expected_df[col], rtol=0, atol=scale
+                )
+
+            # A float32 run over the same output removes the stale scales
+            self.assertTrue(
+                compute_pairwise_sims(
+                    dag=dag,
+                    counts=counts,
+                    cutoff=0.5,
+                    path=os.path.join(tempdir, "uint16"),
+                    prefixes=["HP"],
+                    root_node="",
+                )
+            )
+            self.assertFalse(os.path.exists(scales_path))
+            self.assertEqual(
+                read_similarities(paths["uint16"])["resnik_score"].dtype,
+                np.float32,
+            )
+
+    def test_measures_share_resnik(self) -> None:
+        """Test that measures use the same MICA as the Resnik score."""
+        dag = Graph.from_csv(
+            directed=True,
+            node_path="tests/resources/test_multiroot_nodes.tsv",
+            edge_path="tests/resources/test_multiroot_edges.tsv",
+            nodes_column="id",
+            node_list_node_types_column="category",
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+            name="Multiroot",
+        ).to_transposed()
+        counts = dict.fromkeys(dag.get_node_names(), 1)
+        resnik_model = DAGResnik(verbose=False)
+        resnik_model.fit(dag, node_counts=counts)
+        information_contents = get_information_contents(resnik_model)
+        for prune in [False, True]:
+            with tempfile.TemporaryDirectory() as tempdir:
+                self.assertTrue(
+                    compute_pairwise_sims(
+                        dag=dag,
+                        counts=counts,
+                        cutoff=0.5,
+                        path=tempdir,
+                        prefixes=["HP"],
+                        root_node="",
+                        prune=prune,
+                        resnik_model=resnik_model,
+                        measures=["lin"],
+                    )
+                )
+                sims_df = pd.read_csv(
+                    os.path.join(tempdir, "Multiroot_similarities")
+                )
+            total_ics = information_contents[
+                dag.get_node_ids_from_node_names(sims_df["source"])
+            ] + information_contents[
+                dag.get_node_ids_from_node_names(sims_df["destination"])
+            ]
+            np.testing.assert_allclose(
+                sims_df["lin"],
+                2 * sims_df["resnik_score"] / total_ics,
+                rtol=1e-5,
+            )
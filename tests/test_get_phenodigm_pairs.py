@@ -2,6 +2,7 @@
 
 
 import os
+import tempfile
 from unittest import TestCase
 
 import pandas as pd
@@ -35,6 +36,28 @@ class TestGetPhenodigmPairs(TestCase):
         )
         self.assertTrue(os.path.exists(self.outpath))
 
+    def test_make_phenodigm_float32(self) -> None:
+        """Test that phenodigm output is the same at float32 precision."""
+        with tempfile.TemporaryDirectory() as tempdir:
+            outpath = os.path.join(tempdir, "phenodigm_out")
+            outpath_float32 = os.path.join(tempdir, "phenodigm_out_float32")
+            for precision, precision_outpath in [
+                ("float64", outpath),
+                ("float32", outpath_float32),
+            ]:
+                make_phenodigm(
+                    cutoff=self.cutoff,
+                    same_jaccard_sim_file=self.test_jaccard_sim_file,
+                    same_resnik_sim_file=self.test_resnik_sim_file,
+                    mapping_file=self.mapping_file,
+                    outpath=precision_outpath,
+                    prefixa=self.prefixa,
+                    prefixb=self.prefixb,
+                    precision=precision,
+                )
+            with open(outpath) as infile, open(outpath_float32) as infile32:
+                self.assertEqual(infile.read(), infile32.read())
+
     def test_make_filtered_map(self) -> None:
         """Test that prefix-filtered map is as expected."""
         map_df = pd.read_csv(
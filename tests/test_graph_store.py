@@ -0,0 +1,389 @@
+"""Test the local graph store."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from typing import cast
+from unittest import TestCase, mock
+
+import pandas as pd
+from click.testing import CliRunner, Result
+
+from semsim.cli import main
+from semsim.graph_store import (
+    UNINDEXABLE_SUFFIX,
+    get_graph_url,
+    get_index_path,
+    load_manifest,
+    load_staged_graph,
+    stage_graph,
+)
+from semsim.process_ontology import (
+    build_query_index,
+    get_similarities,
+    load_graph,
+    load_query_graph,
+)
+from semsim.shared_model import compute_shared_subset_sims
+
+
+class TestGraphStore(TestCase):
+    """Test staging and loading graphs without network access."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.store_dir = os.path.join(self.tempdir.name, "graphs")
+        self.input_file = self.make_archive("tests/resources/test_dag")
+        self.name = "TEST"
+        self.version = "2022-06-11"
+        self.predicate = "biolink:subclass_of"
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.tempdir.cleanup()
+
+    def make_archive(self, prefix: str) -> str:
+        """Archive node and edge files as a KGX graph."""
+        path = os.path.join(
+            self.tempdir.name, f"{os.path.basename(prefix)}_kgx.tar.gz"
+        )
+        with tarfile.open(path, "w:gz") as archive:
+            for suffix in ["nodes", "edges"]:
+                archive.add(
+                    f"{prefix}_{suffix}.tsv",
+                    arcname=f"test_kgx_{suffix}.tsv",
+                )
+        return path
+
+    def test_stage_and_load_graph(self) -> None:
+        """Test that a staged graph is recorded and can be loaded."""
+        stage_graph(
+            self.store_dir, self.name, self.version, self.input_file
+        )
+        manifest = load_manifest(self.store_dir)
+        self.assertIn(self.version, manifest[self.name])
+        self.assertEqual(
+            set(manifest[self.name][self.version]["files"]),
+            {"nodes", "edges"},
+        )
+
+        # Loading reads the extracted lists, without writing to the store
+        before = self.list_store_files()
+        graph = load_staged_graph(self.store_dir, self.name, self.version)
+        self.assertEqual(graph.get_number_of_nodes(), 10)
+        self.assertEqual(self.list_store_files(), before)
+
+    def list_store_files(self) -> dict:
+        """List the files in the graph store with their modification times."""
+        return {
+            os.path.join(root, name): os.stat(
+                os.path.join(root, name)
+            ).st_mtime_ns
+            for root, _, names in os.walk(self.store_dir)
+            for name in names
+        }
+
+    def test_load_graph_checks_integrity(self) -> None:
+        """Test that a modified graph file is not loaded."""
+        stage_graph(self.store_dir, self.name, self.version, self.input_file)
+        entry = load_manifest(self.store_dir)[self.name][self.version]
+        edges_path = os.path.join(
+            self.store_dir, entry["files"]["edges"]["path"]
+        )
+        with open(edges_path, "a") as outfile:
+            outfile.write("HP:0000119\tbiolink:subclass_of\tHP:0000001\n")
+        with self.assertRaises(ValueError):
+            load_staged_graph(self.store_dir, self.name, self.version)
+
+    def test_load_graph_requires_staged_version(self) -> None:
+        """Test that only a staged version is loaded."""
+        stage_graph(
+            self.store_dir, self.name, self.version, self.input_file
+        )
+        with self.assertRaises(ValueError):
+            load_staged_graph(self.store_dir, self.name, "2023-01-01")
+
+    def test_get_graph_url(self) -> None:
+        """Test that KG-OBO graph URLs are found without network access."""
+        self.assertTrue(
+            get_graph_url("HP", self.version).endswith(
+                f"/hp/{self.version}/hp_kgx_tsv.tar.gz"
+            )
+        )
+
+    def test_get_similarities_from_graph_store(self) -> None:
+        """Test that similarities are computed from a staged graph."""
+        stage_graph(
+            self.store_dir, self.name, self.version, self.input_file
+        )
+        self.assertTrue(
+            get_similarities(
+                ontology=self.name,
+                cutoff=0.5,
+                annot_file=None,
+                annot_col=None,
+                output_dir=self.tempdir.name,
+                nodes=["HP"],
+                predicate="biolink:subclass_of",
+                root_node="",
+                subset=False,
+                graph_store=self.store_dir,
+                graph_version=self.version,
+            )
+        )
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.tempdir.name, f"{self.name}_similarities")
+            )
+        )
+
+    def assert_query_index_matches(self, nodes: list, version: str) -> None:
+        """Check that an index scores nodes like the staged graph."""
+        index_path = get_index_path(
+            self.store_dir, self.name, version, self.predicate
+        )
+        self.assertTrue(
+            build_query_index(
+                load_query_graph(
+                    self.name, self.store_dir, version, self.predicate
+                ),
+                index_path,
+            )
+        )
+        indexed = compute_shared_subset_sims(index_path, nodes)
+        expected = cast(
+            dict,
+            get_similarities(
+                ontology=self.name,
+                cutoff=0,
+                annot_file=None,
+                annot_col=None,
+                output_dir=None,
+                nodes=nodes,
+                predicate="biolink:subclass_of",
+                root_node="",
+                subset=True,
+                graph_store=self.store_dir,
+                graph_version=version,
+            ),
+        )
+        self.assertEqual(set(indexed), set(expected))
+        for pair, scores in expected.items():
+            for score, indexed_score in zip(scores, indexed[pair]):
+                self.assertAlmostEqual(score, indexed_score, places=5)
+
+    def test_query_index(self) -> None:
+        """Test that an indexed query matches the whole-graph result."""
+        stage_graph(
+            self.store_dir, self.name, self.version, self.input_file
+        )
+        nodes = ["HP:0000271", "HP:0012372", "HP:0000598"]
+        self.assert_query_index_matches(nodes, self.version)
+
+        # With multiple roots, the index is scored like the whole graph
+        multiroot_version = "2022-06-12"
+        stage_graph(
+            self.store_dir,
+            self.name,
+            multiroot_version,
+            self.make_archive("tests/resources/test_multiroot"),
+        )
+        self.assert_query_index_matches(nodes, multiroot_version)
+
+        # A cached index is queried without importing grape
+        result = subprocess.run(  # noqa: S603
+            [
+                sys.executable,
+                "-c",
+                "import sys;"
+                "from semsim.cli import main;"
+                "main(['somesim', '-g', sys.argv[1], '-v', sys.argv[2],"
+                " '-p', 'HP:0000271,HP:0012372', 'TEST'],"
+                " standalone_mode=False);"
+                "print('grape' in sys.modules)",
+                self.store_dir,
+                self.version,
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.splitlines()[-1], "False")
+
+    def test_sim_matches_somesim(self) -> None:
+        """Test that sim and somesim give the same Resnik scores."""
+        # With multiple roots, grape's Resnik model does not always
+        # find the most informative common ancestor, which for
+        # HP:0000598 and HP:0012372 is HP:0000501.
+        stage_graph(
+            self.store_dir,
+            self.name,
+            self.version,
+            self.make_archive("tests/resources/test_multiroot"),
+        )
+        output_dir = os.path.join(self.tempdir.name, "output")
+        runner = CliRunner()
+        result = runner.invoke(
+            main,
+            [
+                "sim",
+                "-g",
+                self.store_dir,
+                "-v",
+                self.version,
+                "-p",
+                "HP",
+                "-c",
+                "0.5",
+                "-o",
+                output_dir,
+                self.name,
+            ],
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        sims_df = pd.read_csv(
+            os.path.join(output_dir, f"{self.name}_similarities")
+        )
+        scores = {
+            frozenset(pair): score
+            for *pair, score in zip(
+                sims_df["source"],
+                sims_df["destination"],
+                sims_df["resnik_score"],
+            )
+        }
+        self.assertIn(frozenset(["HP:0000598", "HP:0012372"]), scores)
+
+        participants = sorted(
+            set(sims_df["source"]) | set(sims_df["destination"])
+        )
+        result = runner.invoke(
+            main,
+            [
+                "somesim",
+                "-g",
+                self.store_dir,
+                "-v",
+                self.version,
+                "-p",
+                ",".join(participants),
+                self.name,
+            ],
+            standalone_mode=False,
+        )
+        self.assertIsNone(result.exception, result.output)
+        for pair, (resnik, _) in result.return_value.items():
+            if frozenset(pair) in scores:
+                self.assertAlmostEqual(
+                    scores[frozenset(pair)], resnik, places=5
+                )
+
+    def test_query_index_failure_cleanup(self) -> None:
+        """Test that a partly written index is removed on failure."""
+        stage_graph(
+            self.store_dir, self.name, self.version, self.input_file
+        )
+        index_path = get_index_path(
+            self.store_dir, self.name, self.version, self.predicate
+        )
+        onto_graph = load_query_graph(
+            self.name, self.store_dir, self.version, self.predicate
+        )
+        with mock.patch(
+            "semsim.process_ontology.save_shared_model",
+            side_effect=OSError("No space left on device"),
+        ):
+            with self.assertRaises(OSError):
+                build_query_index(onto_graph, index_path)
+        self.assertEqual(
+            [
+                name
+                for name in os.listdir(os.path.dirname(index_path))
+                if name.startswith(".index-")
+            ],
+            [],
+        )
+        self.assertFalse(os.path.exists(index_path))
+
+    def test_query_index_with_cycles(self) -> None:
+        """Test that a graph with cycles is scored without an index."""
+        prefix = os.path.join(self.tempdir.name, "test_cycles")
+        shutil.copyfile(
+            "tests/resources/test_cyclic_nodes.tsv", f"{prefix}_nodes.tsv"
+        )
+        with open("tests/resources/test_cyclic_edges.tsv") as infile:
+            with open(f"{prefix}_edges.tsv", "w") as outfile:
+                for line in infile:
+                    subject, _, parent = line.split()
+                    if subject != parent:
+                        outfile.write(line)
+        stage_graph(
+            self.store_dir, self.name, self.version, self.make_archive(prefix)
+        )
+
+        index_path = get_index_path(
+            self.store_dir, self.name, self.version, self.predicate
+        )
+        # Each query loads the graph once, then scores it without an index
+        with mock.patch(
+            "semsim.process_ontology.load_graph", wraps=load_graph
+        ) as mock_load_graph:
+            for _ in range(2):
+                result = self.run_somesim("HP:0000002,HP:0000003")
+                self.assertEqual(result.exit_code, 0, result.output)
+                self.assertIn(
+                    "('HP:0000002', 'HP:0000003')", result.output
+                )
+        self.assertEqual(mock_load_graph.call_count, 2)
+        self.assertTrue(os.path.exists(f"{index_path}{UNINDEXABLE_SUFFIX}"))
+        self.assertFalse(os.path.exists(index_path))
+        self.assertFalse(
+            any(
+                name.startswith(".index-")
+                for name in os.listdir(os.path.dirname(index_path))
+            )
+        )
+
+    def test_query_index_filters_predicate(self) -> None:
+        """Test that cycles along other predicates do not prevent indexing."""
+        prefix = os.path.join(self.tempdir.name, "test_related")
+        shutil.copyfile(
+            "tests/resources/test_dag_nodes.tsv", f"{prefix}_nodes.tsv"
+        )
+        shutil.copyfile(
+            "tests/resources/test_dag_edges.tsv", f"{prefix}_edges.tsv"
+        )
+        with open(f"{prefix}_edges.tsv", "a") as outfile:
+            outfile.write("HP:0000001\tbiolink:related_to\tHP:0000234\n")
+        stage_graph(
+            self.store_dir, self.name, self.version, self.make_archive(prefix)
+        )
+
+        result = self.run_somesim("HP:0000271,HP:0012372")
+        self.assertEqual(result.exit_code, 0, result.output)
+        index_path = get_index_path(
+            self.store_dir, self.name, self.version, self.predicate
+        )
+        self.assertTrue(os.path.isdir(index_path))
+        self.assertFalse(os.path.exists(f"{index_path}{UNINDEXABLE_SUFFIX}"))
+
+    def run_somesim(self, participants: str) -> Result:
+        """Run the somesim command on the staged graph."""
+        runner = CliRunner()
+        return runner.invoke(
+            main,
+            [
+                "somesim",
+                "-g",
+                self.store_dir,
+                "-v",
+                self.version,
+                "-p",
+                participants,
+                self.name,
+            ],
+        )
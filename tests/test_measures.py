@@ -0,0 +1,126 @@
+"""Test additional similarity measures."""
+
+import os
+import tempfile
+from itertools import combinations
+from unittest import TestCase
+
+import numpy as np
+from grape import Graph
+from grape.similarities import DAGResnik
+
+from semsim.ancestors import get_ancestor_closure
+from semsim.compute_pairwise_similarities import compute_pairwise_sims
+from semsim.measures import (
+    MEASURES,
+    compute_measures,
+    get_ancestor_information_contents,
+)
+from semsim.precision import read_similarities
+from semsim.pruning import get_information_contents
+
+
+class TestMeasures(TestCase):
+    """Test measures computed from shared pair statistics."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.test_graph = Graph.from_csv(
+            directed=True,
+            node_path="tests/resources/test_dag_nodes.tsv",
+            edge_path="tests/resources/test_dag_edges.tsv",
+            nodes_column="id",
+            node_list_node_types_column="category",
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+        ).to_transposed()
+        self.counts = dict.fromkeys(self.test_graph.get_node_names(), 1)
+        self.resnik_model = DAGResnik(verbose=False)
+        self.resnik_model.fit(self.test_graph, node_counts=self.counts)
+        self.ancestor_closure = get_ancestor_closure(self.test_graph)
+        self.information_contents = get_information_contents(
+            self.resnik_model
+        )
+        self.pairs = np.array(
+            list(combinations(range(self.test_graph.get_number_of_nodes()), 2))
+        )
+
+    def test_compute_measures(self) -> None:
+        """Test that measures match their definitions on ancestor sets."""
+        indptr, indices = self.ancestor_closure
+        ics = self.information_contents.astype(np.float64)
+        similarities = compute_measures(
+            self.ancestor_closure,
+            self.information_contents,
+            self.pairs[:, 0],
+            self.pairs[:, 1],
+            list(MEASURES),
+            chunk_size=7,
+        )
+        for i, (source, destination) in enumerate(self.pairs):
+            first = set(indices[indptr[source]:indptr[source + 1]])
+            second = set(indices[indptr[destination]:indptr[destination + 1]])
+            shared, either = first & second, first | second
+            mica = max(ics[list(shared)], default=0.0)
+            total = ics[source] + ics[destination]
+            expected = {
+                "resnik": mica,
+                "lin": 2 * mica / total if total else 0.0,
+                "jiang_conrath": 1 / (1 + total - 2 * mica),
+                "simgic": ics[list(shared)].sum() / ics[list(either)].sum()
+                if ics[list(either)].sum()
+                else 0.0,
+                "cosine": len(shared) / np.sqrt(len(first) * len(second)),
+            }
+            for measure, value in expected.items():
+                self.assertAlmostEqual(
+                    similarities[measure][i], value, places=5
+                )
+
+    def test_get_ancestor_information_contents(self) -> None:
+        """Test that each node's ancestor information is summed."""
+        indptr, indices = self.ancestor_closure
+        ancestor_ics = get_ancestor_information_contents(
+            self.ancestor_closure, self.information_contents
+        )
+        for node_id, ancestor_ic in enumerate(ancestor_ics):
+            self.assertAlmostEqual(
+                ancestor_ic,
+                self.information_contents[
+                    indices[indptr[node_id]:indptr[node_id + 1]]
+                ].sum(),
+                places=5,
+            )
+
+    def test_unknown_measure(self) -> None:
+        """Test that an unknown measure is rejected."""
+        with self.assertRaises(ValueError):
+            compute_measures(
+                self.ancestor_closure,
+                self.information_contents,
+                self.pairs[:, 0],
+                self.pairs[:, 1],
+                ["unknown"],
+            )
+
+    def test_measures_in_output(self) -> None:
+        """Test that selected measures are written as columns."""
+        with tempfile.TemporaryDirectory() as tempdir:
+            self.assertTrue(
+                compute_pairwise_sims(
+                    dag=self.test_graph,
+                    counts=self.counts,
+                    cutoff=0.0,
+                    path=tempdir,
+                    prefixes=["HP"],
+                    root_node="",
+                    measures=["lin", "cosine"],
+                )
+            )
+            sims_df = read_similarities(
+                os.path.join(tempdir, "Graph_similarities")
+            )
+        self.assertIn("lin", sims_df.columns)
+        self.assertIn("cosine", sims_df.columns)
+        self.assertTrue(((sims_df["lin"] >= 0) & (sims_df["lin"] <= 1)).all())
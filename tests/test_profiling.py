@@ -0,0 +1,114 @@
+"""Test profiling of pipeline stages."""
+
+import os
+import pstats
+import tempfile
+import time
+from unittest import TestCase
+
+from grape import Graph
+
+from semsim.compute_pairwise_similarities import compute_pairwise_sims
+from semsim.profiling import profile_stage
+
+
+def busy_work(seconds: float) -> None:
+    """Keep busy for a while."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiling(TestCase):
+    """Test that stages write profiles and collapsed stacks."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.tempdir.cleanup()
+
+    def test_profile_stage(self) -> None:
+        """Test that a stage's profile and stacks are written."""
+        with profile_stage(self.tempdir.name, "busy"):
+            busy_work(0.05)
+        stats = pstats.Stats(os.path.join(self.tempdir.name, "busy.prof"))
+        self.assertIn(
+            "busy_work", stats.get_stats_profile().func_profiles
+        )
+        with open(os.path.join(self.tempdir.name, "busy.collapsed")) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(stack.startswith("busy;"))
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any("busy_work" in line for line in lines))
+
+    def test_profile_compiled_code(self) -> None:
+        """Test that time in grape is weighted by its wall time."""
+        start = time.perf_counter()
+        with profile_stage(self.tempdir.name, "generate"):
+            Graph.generate_random_connected_graph(
+                number_of_nodes=100_000, directed=False
+            )
+        elapsed = time.perf_counter() - start
+        weights = {}
+        with open(
+            os.path.join(self.tempdir.name, "generate.collapsed")
+        ) as infile:
+            for line in infile:
+                stack, count = line.rsplit(" ", 1)
+                weights[stack] = int(count) * 1e-6
+        grape_time = sum(
+            weight
+            for stack, weight in weights.items()
+            if "generate_random_connected_graph" in stack.split(";")[-1]
+        )
+        self.assertGreater(grape_time, 0.8 * elapsed)
+        self.assertLessEqual(sum(weights.values()), elapsed)
+
+    def test_profiling_disabled(self) -> None:
+        """Test that nothing is written without a profile directory."""
+        with profile_stage(None, "busy"):
+            busy_work(0.01)
+        self.assertEqual(os.listdir(self.tempdir.name), [])
+
+    def test_profile_compute_pairwise_sims(self) -> None:
+        """Test that each stage of computing similarities is profiled."""
+        dag = Graph.from_csv(
+            directed=True,
+            node_path="tests/resources/test_dag_nodes.tsv",
+            edge_path="tests/resources/test_dag_edges.tsv",
+            nodes_column="id",
+            node_list_node_types_column="category",
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+        ).to_transposed()
+        profile_dir = os.path.join(self.tempdir.name, "profile")
+        compute_pairwise_sims(
+            dag=dag,
+            counts=dict.fromkeys(dag.get_node_names(), 1),
+            cutoff=0.0,
+            path=self.tempdir.name,
+            prefixes=["HP"],
+            root_node="",
+            profile_dir=profile_dir,
+        )
+        for stage in [
+            "fit_resnik",
+            "resnik",
+            "jaccard",
+            "node_names",
+            "sort",
+            "write",
+        ]:
+            for suffix in [".prof", ".collapsed"]:
+                self.assertTrue(
+                    os.path.exists(
+                        os.path.join(profile_dir, f"{stage}{suffix}")
+                    )
+                )
@@ -0,0 +1,128 @@
+"""Test pruning of Resnik candidate pairs."""
+
+from unittest import TestCase
+
+from grape import Graph
+from grape.similarities import DAGResnik
+
+from semsim.ancestors import get_ancestor_closure
+from semsim.pruning import get_pruned_resnik_similarities
+
+
+class TestPruning(TestCase):
+    """Test pruned computation of Resnik similarities."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.test_graph = Graph.from_csv(
+            directed=True,
+            node_path="tests/resources/test_dag_nodes.tsv",
+            edge_path="tests/resources/test_dag_edges.tsv",
+            nodes_column="id",
+            node_list_node_types_column="category",
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+        ).to_transposed()
+        self.test_counts = dict.fromkeys(self.test_graph.get_node_names(), 1)
+        self.resnik_model = DAGResnik(verbose=False)
+        self.resnik_model.fit(self.test_graph, node_counts=self.test_counts)
+
+    def test_get_ancestor_closure(self) -> None:
+        """Test that ancestors include the node, its parents and the root."""
+        indptr, indices = get_ancestor_closure(self.test_graph)
+        node_id = self.test_graph.get_node_id_from_node_name("HP:0012372")
+        ancestors = set(
+            self.test_graph.get_node_names_from_node_ids(
+                indices[indptr[node_id]:indptr[node_id + 1]]
+            )
+        )
+        self.assertEqual(
+            ancestors,
+            {
+                "HP:0012372",
+                "HP:0000478",
+                "HP:0000271",
+                "HP:0000234",
+                "HP:0000152",
+                "HP:0000118",
+                "HP:0000001",
+            },
+        )
+
+    def test_get_pruned_resnik_similarities(self) -> None:
+        """Test that pruning keeps exactly the pairs meeting the cutoff."""
+        for cutoff in [0.5, 1.0, 2.0]:
+            pairs, scores = (
+                self.resnik_model.get_similarities_from_clique_graph_node_ids(
+                    node_ids=[
+                        node_id
+                        for node_id, name in enumerate(
+                            self.test_graph.get_node_names()
+                        )
+                        if name.startswith("HP")
+                    ],
+                )
+            )
+            expected = {
+                (min(pair), max(pair))
+                for pair, score in zip(pairs.tolist(), scores)
+                if score >= cutoff
+            }
+            pruned_df = get_pruned_resnik_similarities(
+                dag=self.test_graph,
+                resnik_model=self.resnik_model,
+                prefixes=["HP"],
+                cutoff=cutoff,
+            )
+            self.assertEqual(
+                set(zip(pruned_df["source"], pruned_df["destination"])),
+                expected,
+            )
+            self.assertTrue((pruned_df["resnik_score"] >= cutoff).all())
+
+    def test_pruned_compared_to_prefix_clique(self) -> None:
+        """Test pruning against the clique of prefixed nodes it replaces.
+
+        The clique drops some pairs meeting the cutoff, so pruning
+        may keep more pairs, but only with their correct scores.
+        """
+        cutoff = 0.5
+        clique_df = (
+            self.resnik_model.get_similarities_from_clique_graph_node_prefixes(
+                node_prefixes=["HP"],
+                minimum_similarity=cutoff,
+                return_similarities_dataframe=True,
+            )
+        )
+        pruned_df = get_pruned_resnik_similarities(
+            dag=self.test_graph,
+            resnik_model=self.resnik_model,
+            prefixes=["HP"],
+            cutoff=cutoff,
+        )
+        pruned = {
+            (source, destination): score
+            for source, destination, score in zip(
+                pruned_df["source"],
+                pruned_df["destination"],
+                pruned_df["resnik_score"],
+            )
+        }
+        for source, destination, score in zip(
+            clique_df["source"],
+            clique_df["destination"],
+            clique_df["resnik_score"],
+        ):
+            pair = (min(source, destination), max(source, destination))
+            self.assertAlmostEqual(pruned[pair], score, places=5)
+
+        self.assertGreaterEqual(len(pruned), len(clique_df))
+        model = self.resnik_model
+        for (source, destination), score in pruned.items():
+            _, expected = model.get_similarities_from_bipartite_graph_node_ids(
+                source_node_ids=[int(source)],
+                destination_node_ids=[int(destination)],
+            )
+            self.assertAlmostEqual(score, expected[0], places=5)
+            self.assertGreaterEqual(score, cutoff)
@@ -0,0 +1,167 @@
+"""Test scoring from a shared, memory-mapped model."""
+
+import tempfile
+from itertools import combinations
+from unittest import TestCase
+
+import numpy as np
+from grape import Graph
+from grape.similarities import DAGResnik
+
+from semsim.compute_pairwise_similarities import compute_subset_sims
+from semsim.pruning import get_information_contents
+from semsim.shared_model import (
+    compute_shared_subset_sims,
+    extract_query_subgraph,
+    get_node_ids_from_shared_model,
+    get_shared_jaccard_similarities,
+    get_shared_resnik_similarities,
+    load_shared_model,
+    save_shared_model,
+    validate_query_subgraph,
+)
+
+
+class TestSharedModel(TestCase):
+    """Test that a shared model scores like the graph it came from."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.test_graph = Graph.from_csv(
+            directed=True,
+            node_path="tests/resources/test_dag_nodes.tsv",
+            edge_path="tests/resources/test_dag_edges.tsv",
+            nodes_column="id",
+            node_list_node_types_column="category",
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+        ).to_transposed()
+        self.resnik_model = DAGResnik(verbose=False)
+        self.resnik_model.fit(
+            self.test_graph,
+            node_counts=dict.fromkeys(self.test_graph.get_node_names(), 1),
+        )
+        self.tempdir = tempfile.TemporaryDirectory()
+        save_shared_model(
+            self.test_graph, self.resnik_model, self.tempdir.name
+        )
+        self.model = load_shared_model(self.tempdir.name)
+        self.pairs = np.array(
+            list(combinations(range(self.test_graph.get_number_of_nodes()), 2))
+        )
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.tempdir.cleanup()
+
+    def test_get_shared_resnik_similarities(self) -> None:
+        """Test that Resnik similarities match the Resnik model."""
+        pairs, scores = (
+            self.resnik_model.get_similarities_from_clique_graph_node_ids(
+                node_ids=list(range(self.test_graph.get_number_of_nodes())),
+            )
+        )
+        expected = {
+            (min(pair), max(pair)): score
+            for pair, score in zip(pairs.tolist(), scores)
+        }
+        similarities = get_shared_resnik_similarities(
+            self.model, self.pairs[:, 0], self.pairs[:, 1]
+        )
+        for pair, similarity in zip(self.pairs.tolist(), similarities):
+            self.assertAlmostEqual(
+                similarity, expected.get(tuple(pair), 0.0), places=5
+            )
+
+    def test_get_shared_jaccard_similarities(self) -> None:
+        """Test that Jaccard similarities match the graph."""
+        expected = self.test_graph.get_ancestors_jaccard_from_node_ids(
+            self.test_graph.get_breadth_first_search_from_node_ids(
+                src_node_id=self.test_graph.get_root_node_ids()[0],
+                compute_predecessors=True,
+            ),
+            list(self.pairs[:, 0]),
+            list(self.pairs[:, 1]),
+        )
+        similarities = get_shared_jaccard_similarities(
+            self.model, self.pairs[:, 0], self.pairs[:, 1]
+        )
+        np.testing.assert_allclose(similarities, expected, rtol=1e-5)
+
+    def test_compute_shared_subset_sims(self) -> None:
+        """Test similarities for a list of node names."""
+        nodes = ["HP:0000271", "HP:0012372", "HP:0000598"]
+        sims = compute_shared_subset_sims(self.tempdir.name, nodes)
+        self.assertEqual(len(sims), 3)
+        self.assertTrue(all(len(value) == 2 for value in sims.values()))
+        with self.assertRaises(ValueError):
+            get_node_ids_from_shared_model(self.model, ["HP:9999999"])
+
+    def test_extract_query_subgraph(self) -> None:
+        """Test that an extracted subgraph scores like the full model."""
+        node_ids = get_node_ids_from_shared_model(
+            self.model, ["HP:0000271", "HP:0012372", "HP:0000598"]
+        )
+        subgraph, subgraph_ids = extract_query_subgraph(self.model, node_ids)
+        validate_query_subgraph(subgraph)
+        self.assertLess(
+            len(subgraph["names"]), self.test_graph.get_number_of_nodes()
+        )
+        pairs = np.array(list(combinations(range(len(node_ids)), 2)))
+        for scorer in [
+            get_shared_resnik_similarities,
+            get_shared_jaccard_similarities,
+        ]:
+            np.testing.assert_allclose(
+                scorer(
+                    subgraph,
+                    subgraph_ids[pairs[:, 0]],
+                    subgraph_ids[pairs[:, 1]],
+                ),
+                scorer(
+                    self.model, node_ids[pairs[:, 0]], node_ids[pairs[:, 1]]
+                ),
+            )
+
+        subgraph["root_predecessors"][:] = len(subgraph["names"])
+        with self.assertRaises(ValueError):
+            validate_query_subgraph(subgraph)
+
+    def test_multiple_roots(self) -> None:
+        """Test that a shared model scores like the graph with many roots."""
+        multiroot_graph = Graph.from_csv(
+            directed=True,
+            node_path="tests/resources/test_multiroot_nodes.tsv",
+            edge_path="tests/resources/test_multiroot_edges.tsv",
+            nodes_column="id",
+            node_list_node_types_column="category",
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+        ).to_transposed()
+        self.assertEqual(len(multiroot_graph.get_root_node_ids()), 2)
+        counts = dict.fromkeys(multiroot_graph.get_node_names(), 1)
+        resnik_model = DAGResnik(verbose=False)
+        resnik_model.fit(multiroot_graph, node_counts=counts)
+        with tempfile.TemporaryDirectory() as model_path:
+            save_shared_model(multiroot_graph, resnik_model, model_path)
+            nodes = multiroot_graph.get_node_names()
+            sims = compute_shared_subset_sims(model_path, nodes)
+        expected = compute_subset_sims(multiroot_graph, counts, nodes)
+        self.assertEqual(set(sims), set(expected))
+        for pair, scores in expected.items():
+            np.testing.assert_allclose(sims[pair], scores, rtol=1e-5)
+
+        # Ancestors under either root are shared
+        information_contents = get_information_contents(resnik_model)
+        self.assertAlmostEqual(
+            sims[("HP:0000598", "HP:0012372")][0],
+            information_contents[
+                multiroot_graph.get_node_id_from_node_name("HP:0000501")
+            ],
+            places=5,
+        )
+        self.assertAlmostEqual(
+            sims[("HP:0000271", "HP:0012372")][1], 0.75, places=5
+        )
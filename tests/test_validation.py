@@ -0,0 +1,123 @@
+"""Test validation and repair of DAGs."""
+
+import multiprocessing
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from grape import Graph
+
+from semsim.validation import (
+    get_dag_diagnostics,
+    load_diagnostics_cache,
+    save_diagnostics,
+    validate_dag,
+)
+
+
+class TestValidation(TestCase):
+    """Test single-pass DAG validation."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.test_graph = Graph.from_csv(
+            directed=True,
+            node_path="tests/resources/test_cyclic_nodes.tsv",
+            edge_path="tests/resources/test_cyclic_edges.tsv",
+            nodes_column="id",
+            node_list_node_types_column="category",
+            sources_column="subject",
+            destinations_column="object",
+            edge_list_edge_types_column="predicate",
+        ).to_transposed()
+
+    def test_get_dag_diagnostics(self) -> None:
+        """Test that components, self loops and cycles are found."""
+        diagnostics = get_dag_diagnostics(self.test_graph)
+        self.assertEqual(diagnostics["number_of_components"], 3)
+        self.assertEqual(diagnostics["largest_component_size"], 6)
+        self.assertEqual(len(diagnostics["selfloop_edge_ids"]), 1)
+        self.assertTrue(diagnostics["has_cycles"])
+        self.assertNotIn("cycle_edge_ids", diagnostics)
+        self.assertEqual(len(diagnostics["disconnected_node_ids"]), 3)
+
+        diagnostics = get_dag_diagnostics(
+            self.test_graph, find_cycle_edges=True
+        )
+        self.assertEqual(len(diagnostics["cycle_edge_ids"]), 2)
+
+    def test_validate_dag_without_repair(self) -> None:
+        """Test that self loops are an error unless repaired."""
+        with self.assertRaises(ValueError):
+            validate_dag(self.test_graph)
+
+    def test_validate_dag_finds_cycle_edges_to_repair(self) -> None:
+        """Test that edges closing cycles are only found for repair."""
+        with tempfile.TemporaryDirectory() as tempdir:
+            cache_path = os.path.join(tempdir, "validation.json")
+            with mock.patch(
+                "semsim.validation.get_cycle_edge_ids",
+                side_effect=AssertionError("Cycles were searched."),
+            ):
+                with self.assertRaises(ValueError):
+                    validate_dag(self.test_graph, cache_path=cache_path)
+
+            # Cached diagnostics without the edges are completed
+            dag = validate_dag(
+                self.test_graph, repair=True, cache_path=cache_path
+            )
+            self.assertTrue(dag.is_directed_acyclic())
+            (diagnostics,) = load_diagnostics_cache(cache_path).values()
+            self.assertEqual(len(diagnostics["cycle_edge_ids"]), 2)
+
+    def test_validate_dag_with_repair(self) -> None:
+        """Test that the repaired graph is a connected DAG."""
+        with tempfile.TemporaryDirectory() as tempdir:
+            cache_path = os.path.join(tempdir, "validation.json")
+            for _ in range(2):
+                dag = validate_dag(
+                    self.test_graph, repair=True, cache_path=cache_path
+                )
+                self.assertEqual(dag.get_number_of_nodes(), 6)
+                self.assertTrue(dag.is_directed_acyclic())
+                self.assertFalse(dag.has_selfloops())
+                dag.must_be_connected()
+            self.assertTrue(os.path.exists(cache_path))
+
+    def test_validate_dag_from_cache(self) -> None:
+        """Test that a cached graph is validated without any passes."""
+        with tempfile.TemporaryDirectory() as tempdir:
+            cache_path = os.path.join(tempdir, "validation.json")
+            expected = validate_dag(
+                self.test_graph, repair=True, cache_path=cache_path
+            )
+            with mock.patch(
+                "semsim.validation.get_component_labels",
+                side_effect=AssertionError("Components were recomputed."),
+            ), mock.patch(
+                "semsim.validation.get_cycle_edge_ids",
+                side_effect=AssertionError("Cycles were recomputed."),
+            ):
+                dag = validate_dag(
+                    self.test_graph, repair=True, cache_path=cache_path
+                )
+            self.assertEqual(
+                sorted(dag.get_node_names()), sorted(expected.get_node_names())
+            )
+
+    def test_save_diagnostics_concurrently(self) -> None:
+        """Test that processes caching diagnostics at once keep all."""
+        diagnostics = get_dag_diagnostics(self.test_graph)
+        with tempfile.TemporaryDirectory() as tempdir:
+            cache_path = os.path.join(tempdir, "validation.json")
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(4) as pool:
+                pool.starmap(
+                    save_diagnostics,
+                    [(cache_path, str(i), diagnostics) for i in range(16)],
+                )
+            cache = load_diagnostics_cache(cache_path)
+            self.assertEqual(set(cache), {str(i) for i in range(16)})
+            self.assertEqual(
+                [name for name in os.listdir(tempdir) if name[0] == "."], []
+            )